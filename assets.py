@@ -0,0 +1,252 @@
+"""Static asset pipeline.
+
+build() copies every file in static/ to static/build/ under a content-hashed
+name (mafia_bg_pic.3f2a9c1e.jpg), writes resized WebP/AVIF variants of the
+images and precompressed .gz/.br copies of the text assets, and records the
+result in static/build/manifest.json. Hashed files never change, so they are
+served with a one-year `Cache-Control: immutable` and a strong ETag. Files of
+an older build stay servable for STALE_KEEP_SECONDS after a rebuild drops
+them, so pages cached before a deploy keep loading their assets.
+
+Templates reference assets through asset_url() / bg_image_set(), which fall
+back to the plain /static/ URL when a file has not been built.
+
+Pillow (image variants) and Brotli (.br copies) are optional: without them
+the pipeline still hashes files and writes .gz copies.
+
+Run `python assets.py` to build ahead of time; the app also builds on
+startup when the sources changed.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import time
+
+from flask import abort, request, send_from_directory
+from werkzeug.security import safe_join
+
+try:
+    from PIL import Image, features as pil_features
+except ImportError:  # Pillow not installed: no image variants
+    Image = None
+
+try:
+    import brotli
+except ImportError:  # Brotli not installed: gzip only
+    brotli = None
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+BUILD_DIR = os.path.join(STATIC_DIR, 'build')
+MANIFEST_PATH = os.path.join(BUILD_DIR, 'manifest.json')
+
+# Files that must keep a stable URL (service worker scope) and are not hashed
+UNHASHED = {'sw.js'}
+IMAGE_EXTS = {'.jpg', '.jpeg', '.png'}
+TEXT_EXTS = {'.js', '.json', '.css', '.svg', '.txt', '.html'}
+# Widths for resized image variants; the original width is always included
+IMAGE_WIDTHS = (192, 360)
+# CSS width bg_image_set() assumes an image is shown at (a phone viewport); a variant
+# of width w gets the resolution descriptor w / BG_CSS_WIDTH
+BG_CSS_WIDTH = 360
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+# How long files dropped by a rebuild are kept for pages that still reference them
+STALE_KEEP_SECONDS = 7 * 24 * 60 * 60
+
+_manifest = {'sources': {}, 'assets': {}}
+
+
+def _hash_bytes(data):
+    return hashlib.sha256(data).hexdigest()[:12]
+
+
+def _hashed_name(name, digest, suffix=None):
+    base, ext = os.path.splitext(name)
+    return f'{base}.{digest}{suffix or ext}'
+
+
+def _write_precompressed(path, data):
+    with gzip.open(path + '.gz', 'wb', compresslevel=9) as f:
+        f.write(data)
+    if brotli is not None:
+        with open(path + '.br', 'wb') as f:
+            f.write(brotli.compress(data, quality=11))
+
+
+def _image_variants(name, src_path, digest):
+    """Write resized WebP/AVIF copies. Returns [{url, width, type}] best format first."""
+    if Image is None:
+        return []
+    formats = [('webp', 'image/webp', {'quality': 80, 'method': 6})]
+    if pil_features.check('avif'):
+        formats.insert(0, ('avif', 'image/avif', {'quality': 55}))
+
+    base, _ = os.path.splitext(name)
+    out = []
+    with Image.open(src_path) as im:
+        im = im.convert('RGB')
+        widths = sorted({w for w in IMAGE_WIDTHS if w < im.width} | {im.width})
+        for fmt, mime, opts in formats:
+            for w in widths:
+                h = round(im.height * w / im.width)
+                resized = im if w == im.width else im.resize((w, h), Image.LANCZOS)
+                fname = f'{base}-{w}.{digest}.{fmt}'
+                resized.save(os.path.join(BUILD_DIR, fname), fmt.upper(), **opts)
+                out.append({'url': fname, 'width': w, 'type': mime})
+    return out
+
+
+def build(force=False):
+    """Build hashed/derived assets if any source changed. Returns the manifest."""
+    global _manifest
+    sources = {}
+    for name in sorted(os.listdir(STATIC_DIR)):
+        path = os.path.join(STATIC_DIR, name)
+        if os.path.isfile(path) and name not in UNHASHED:
+            with open(path, 'rb') as f:
+                sources[name] = _hash_bytes(f.read())
+
+    existing = {}
+    try:
+        with open(MANIFEST_PATH, 'r', encoding='utf-8') as f:
+            existing = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        pass
+    if not force and existing.get('sources') == sources:
+        _manifest = existing
+        return _manifest
+
+    os.makedirs(BUILD_DIR, exist_ok=True)
+    assets = {}
+    for name, digest in sources.items():
+        src_path = os.path.join(STATIC_DIR, name)
+        with open(src_path, 'rb') as f:
+            data = f.read()
+        hashed = _hashed_name(name, digest)
+        out_path = os.path.join(BUILD_DIR, hashed)
+        with open(out_path, 'wb') as f:
+            f.write(data)
+        entry = {'url': hashed}
+        ext = os.path.splitext(name)[1].lower()
+        if ext in TEXT_EXTS:
+            _write_precompressed(out_path, data)
+        elif ext in IMAGE_EXTS:
+            try:
+                entry['variants'] = _image_variants(name, src_path, digest)
+            except OSError as e:
+                print(f"Warning: could not build image variants for {name}: {e}")
+        assets[name] = entry
+
+    stale = _prune(assets, existing.get('stale', {}))
+    _manifest = {'sources': sources, 'assets': assets, 'stale': stale}
+    with open(MANIFEST_PATH, 'w', encoding='utf-8') as f:
+        json.dump(_manifest, f, indent=2)
+    print(f"Built {len(assets)} static assets into static/build")
+    return _manifest
+
+
+def _prune(assets, stale):
+    """Delete build files that no manifest entry has referenced for STALE_KEEP_SECONDS.
+    stale maps each unreferenced file to when it was first seen unreferenced; returns the
+    updated map."""
+    live = {MANIFEST_PATH}
+    for entry in assets.values():
+        names = [entry['url']] + [v['url'] for v in entry.get('variants', [])]
+        for fname in names:
+            path = os.path.join(BUILD_DIR, fname)
+            live.update((path, path + '.gz', path + '.br'))
+    now = time.time()
+    kept = {}
+    for fname in os.listdir(BUILD_DIR):
+        path = os.path.join(BUILD_DIR, fname)
+        if path in live:
+            continue
+        since = stale.get(fname, now)
+        if now - since < STALE_KEEP_SECONDS:
+            kept[fname] = since
+            continue
+        try:
+            os.remove(path)
+        except OSError as e:
+            print(f"Warning: could not remove stale asset {fname}: {e}")
+    return kept
+
+
+# ----------------- Template helpers -----------------
+def asset_url(name):
+    """URL of the content-hashed copy of static/<name>, or the plain static URL."""
+    entry = _manifest['assets'].get(name)
+    if not entry:
+        return f'/static/{name}'
+    return f"/static/build/{entry['url']}"
+
+
+def _resolution(width, css_width):
+    return f'{round(width / css_width, 2):g}x'
+
+
+def bg_image_set(name, css_width=BG_CSS_WIDTH):
+    """CSS image-set() for an image shown about css_width CSS pixels wide: every AVIF/WebP variant
+    with a resolution descriptor (width / css_width), then the original. Browsers pick the
+    first type they support at the resolution closest to their device pixel ratio."""
+    entry = _manifest['assets'].get(name)
+    if not entry:
+        return f"url('/static/{name}')"
+    parts = []
+    full_width = 0
+    for v in entry.get('variants', []):
+        full_width = max(full_width, v['width'])
+        parts.append(f"url('/static/build/{v['url']}') {_resolution(v['width'], css_width)} "
+                     f"type('{v['type']}')")
+    ext = os.path.splitext(name)[1].lower().lstrip('.')
+    mime = 'image/jpeg' if ext in ('jpg', 'jpeg') else f'image/{ext}'
+    original = f"url('{asset_url(name)}')"
+    if full_width:
+        original += f' {_resolution(full_width, css_width)}'
+    parts.append(f"{original} type('{mime}')")
+    return 'image-set(' + ', '.join(parts) + ')'
+
+
+# ----------------- Serving -----------------
+def _accepts(encoding):
+    return encoding in request.headers.get('Accept-Encoding', '').lower()
+
+
+def send_static(filename):
+    """Serve static/<filename>. Hashed build files get immutable caching, a strong
+    ETag and a precompressed body when the client accepts one."""
+    if not filename.startswith('build/') or filename == 'build/manifest.json':
+        return send_from_directory(STATIC_DIR, filename)
+
+    name = filename[len('build/'):]
+    path = safe_join(BUILD_DIR, name)
+    if path is None:
+        abort(404)
+    # the hash in the filename identifies the content
+    etag = name.rsplit('.', 2)[-2] if name.count('.') >= 2 else None
+
+    encoding = None
+    for enc, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if _accepts(enc) and os.path.isfile(path + suffix):
+            encoding = enc
+            break
+
+    mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+    if encoding:
+        suffix = '.br' if encoding == 'br' else '.gz'
+        resp = send_from_directory(BUILD_DIR, name + suffix, mimetype=mimetype, download_name=name,
+                                   etag=f'{etag}-{encoding}' if etag else True,
+                                   max_age=IMMUTABLE_MAX_AGE)
+        resp.headers['Content-Encoding'] = encoding
+    else:
+        resp = send_from_directory(BUILD_DIR, name, mimetype=mimetype,
+                                   etag=etag or True, max_age=IMMUTABLE_MAX_AGE)
+    resp.cache_control.public = True
+    resp.cache_control.immutable = True
+    resp.vary.add('Accept-Encoding')
+    return resp
+
+
+if __name__ == '__main__':
+    build(force=True)
@@ -0,0 +1,214 @@
+"""Monte Carlo balance simulator for a room's role setup.
+
+Plays a large number of simplified Mafia games in parallel with NumPy and
+reports how often each side wins. The model is intentionally small:
+
+- Night: the mafia kill a random non-mafia player. Each living doctor
+  protects a random living player; a protected target survives. Each
+  living cop investigates a random living player other than themselves
+  and remembers anyone who turns out to be mafia (godfathers read as
+  innocent).
+- Day: if a living cop knows a living mafia member, the town follows the
+  cop with probability COP_TRUST. Otherwise the town eliminates a random
+  living player.
+- The mafia win once they are at least half of the living players; the
+  town wins once every mafia member is dead.
+
+Results are cached per role configuration (the multiset of simulated
+kinds), so repeat requests for the same setup are free.
+"""
+import math
+from functools import lru_cache
+
+import numpy as np
+
+# Simulated player kinds
+TOWN = 0
+MAFIA = 1
+DOCTOR = 2
+COP = 3
+GODFATHER = 4
+NEUTRAL = 5
+
+DEFAULT_GAMES = 200000
+MAX_GAMES = 500000
+MAX_PLAYERS = 64
+
+# Simulation cost grows with games x players; this many player-games run in
+# roughly 0.4 s, so large setups get fewer games to stay interactive
+MAX_PLAYER_GAMES = 4000000
+
+# Probability that the town lynches a mafia member a living cop has found
+COP_TRUST = 0.8
+
+# z-score for the reported confidence intervals (95%)
+CI_Z = 1.96
+
+
+def classify_role(name, faction):
+    """Map a role name and faction to one of the simulated kinds."""
+    n = (name or '').strip().lower()
+    f = (faction or '').strip().lower()
+    if f == 'mafia':
+        return GODFATHER if 'godfather' in n else MAFIA
+    if f == 'neutral':
+        return NEUTRAL
+    if 'doctor' in n or 'bodyguard' in n:
+        return DOCTOR
+    if 'cop' in n or 'sheriff' in n:
+        return COP
+    return TOWN
+
+
+def setup_key(roles, faction_lookup):
+    """Normalize a room role list ([{name, count, faction}]) to a hashable key.
+
+    faction_lookup is used for roles without an explicit faction
+    (e.g. mafia.get_faction_for_role).
+    """
+    counts = [0] * 6
+    for r in roles:
+        count = int(r.get('count', 0) or 0)
+        if count <= 0:
+            continue
+        name = r.get('name', '')
+        if not isinstance(name, str) or not isinstance(r.get('faction') or '', str):
+            raise ValueError('Role names and factions must be strings')
+        faction = r.get('faction') or faction_lookup(name)
+        counts[classify_role(name, faction)] += count
+    return tuple(counts)
+
+
+def _wilson(wins, n):
+    """Wilson score interval for a binomial proportion."""
+    if n == 0:
+        return 0.0, 0.0, 0.0
+    p = wins / n
+    denom = 1 + CI_Z * CI_Z / n
+    centre = (p + CI_Z * CI_Z / (2 * n)) / denom
+    half = CI_Z * math.sqrt(p * (1 - p) / n + CI_Z * CI_Z / (4 * n * n)) / denom
+    return p, max(0.0, centre - half), min(1.0, centre + half)
+
+
+def _draw(rng, weights):
+    """Draw one row index per column of a (kinds, games) weight matrix.
+
+    Columns whose weights are all zero get row 0; callers mask those out.
+    """
+    running = weights[0].copy()
+    total = weights.sum(axis=0)
+    u = rng.random(weights.shape[1]) * total
+    pick = np.zeros(weights.shape[1], dtype=np.intp)
+    for row in weights[1:]:
+        pick += running <= u
+        running += row
+    return pick
+
+
+def _run(key, games, seed):
+    # Players of one kind are interchangeable, so each game is just the
+    # number of living players per kind plus how many living (non-godfather)
+    # mafia members the cops have already identified. State is laid out as
+    # (kinds, games) so per-game sums run over a handful of contiguous rows.
+    rng = np.random.default_rng(seed)
+    state = np.repeat(np.array(key, dtype=np.int16)[:, None], games, axis=1)
+    known = np.zeros(games, dtype=np.int16)
+    result = np.zeros(games, dtype=np.int8)  # 1 = mafia, 2 = town
+    rounds = np.zeros(games, dtype=np.int32)
+    ids = np.arange(games)
+
+    def settle(state, known, ids):
+        # Record finished games and return the columns still running
+        m = state[MAFIA] + state[GODFATHER]
+        total = state.sum(axis=0)
+        town_won = m == 0
+        mafia_won = ~town_won & (2 * m >= total)
+        result[ids[town_won]] = 2
+        result[ids[mafia_won]] = 1
+        keep = ~(town_won | mafia_won)
+        if keep.all():
+            return state, known, ids
+        return np.compress(keep, state, axis=1), known[keep], ids[keep]
+
+    state, known, ids = settle(state, known, ids)
+    while ids.size:
+        rounds[ids] += 1
+        cols = np.arange(ids.size)
+        total = state.sum(axis=0)
+
+        # Night: cops investigate a random other living player; the findings
+        # are shared between cops and lost once the last cop dies
+        for i in range(key[COP]):
+            looking = state[COP] > i
+            p = (state[MAFIA] - known) / np.maximum(total - 1, 1)
+            known += looking & (rng.random(ids.size) < p)
+
+        # Mafia kill a random non-mafia player unless a doctor guessed right
+        victims = state.copy()
+        victims[MAFIA] = 0
+        victims[GODFATHER] = 0
+        has_victim = total > state[MAFIA] + state[GODFATHER]
+        target = _draw(rng, victims)
+        killed = has_victim
+        if key[DOCTOR]:
+            p_save = 1.0 - (1.0 - 1.0 / total) ** state[DOCTOR]
+            killed = killed & (rng.random(ids.size) >= p_save)
+        state[target[killed], cols[killed]] -= 1
+        known[state[COP] == 0] = 0
+
+        state, known, ids = settle(state, known, ids)
+        if not ids.size:
+            break
+        cols = np.arange(ids.size)
+
+        # Day: follow a cop's lead if there is one, else lynch at random
+        follow = (known > 0) & (rng.random(ids.size) < COP_TRUST)
+        lynched = _draw(rng, state)
+        lynched[follow] = MAFIA
+        hit_known = rng.random(ids.size) * np.maximum(state[MAFIA], 1) < known
+        state[lynched, cols] -= 1
+        known -= follow | ((lynched == MAFIA) & hit_known)
+        known[state[COP] == 0] = 0
+
+        state, known, ids = settle(state, known, ids)
+
+    return result, rounds
+
+
+@lru_cache(maxsize=256)
+def _simulate_cached(key, games):
+    result, rounds = _run(key, games, seed=None)
+    mafia_wins = int((result == 1).sum())
+    town_wins = int((result == 2).sum())
+    mp, mlo, mhi = _wilson(mafia_wins, games)
+    tp, tlo, thi = _wilson(town_wins, games)
+    return {
+        'games': games,
+        'players': int(sum(key)),
+        'mafia': {'win_probability': mp, 'ci_low': mlo, 'ci_high': mhi},
+        'town': {'win_probability': tp, 'ci_low': tlo, 'ci_high': thi},
+        'avg_rounds': float(rounds.mean()) if games else 0.0,
+        'composition': {
+            'town': key[TOWN], 'mafia': key[MAFIA], 'doctor': key[DOCTOR],
+            'cop': key[COP], 'godfather': key[GODFATHER], 'neutral': key[NEUTRAL],
+        },
+    }
+
+
+def simulate(roles, faction_lookup, games=DEFAULT_GAMES):
+    """Estimate win probabilities for a role setup.
+
+    games is capped at MAX_GAMES and at MAX_PLAYER_GAMES / players. Returns a
+    dict with per-side win probabilities and 95% confidence intervals.
+    Raises ValueError for setups that cannot be simulated.
+    """
+    key = setup_key(roles, faction_lookup)
+    players = sum(key)
+    if players < 2:
+        raise ValueError('At least two roles are required')
+    if players > MAX_PLAYERS:
+        raise ValueError(f'At most {MAX_PLAYERS} roles can be simulated')
+    if key[MAFIA] + key[GODFATHER] == 0:
+        raise ValueError('Setup has no Mafia roles')
+    games = max(1, min(int(games), MAX_GAMES, MAX_PLAYER_GAMES // players))
+    return dict(_simulate_cached(key, games))
@@ -0,0 +1,225 @@
+"""Role catalog loaded from roles.json.
+
+A RoleCatalog is immutable once built. The current catalog is a single
+module-level reference that reload() replaces in one assignment, so readers
+never take a lock: a request grabs current() once and keeps a consistent
+view even if a reload lands halfway through it.
+
+A watcher thread polls roles.json's mtime and reloads in the background, so
+a reload never runs on (or stalls) a request thread. Rooms can layer a
+custom role pack over the base catalog with RoleCatalog.with_pack(), which
+wraps both without copying the base.
+"""
+import json
+import os
+import threading
+from types import MappingProxyType
+
+ROLES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'roles.json')
+WATCH_INTERVAL = float(os.environ.get('ROLES_WATCH_INTERVAL', 2.0))
+
+# Limits for host-supplied role packs
+MAX_PACK_ROLES = 100
+MAX_ROLE_NAME = 60
+MAX_DESCRIPTION = 2000
+
+
+class RoleCatalog:
+    """Immutable mapping of role name -> {description, faction}."""
+
+    __slots__ = ('roles', 'factions', '_lower', 'version', 'mtime')
+
+    def __init__(self, roles, version=0, mtime=None):
+        clean = {}
+        for name, info in roles.items():
+            if isinstance(info, dict):
+                clean[name] = MappingProxyType({
+                    'description': info.get('description', ''),
+                    'faction': info.get('faction') or '',
+                })
+            else:
+                # fallback: roles stored as a bare description string
+                clean[name] = MappingProxyType({'description': str(info), 'faction': ''})
+        self.roles = MappingProxyType(clean)
+        # lowercased name -> faction, for quick lookup
+        self.factions = MappingProxyType({name.lower(): info['faction'] for name, info in clean.items()})
+        self._lower = MappingProxyType({name.lower(): name for name in clean})
+        self.version = version
+        self.mtime = mtime
+
+    def __len__(self):
+        return len(self.roles)
+
+    def lookup(self, role_name):
+        """Exact match first, then case-insensitive. Returns the role info or None."""
+        info = self.roles.get(role_name)
+        if info is None:
+            canonical = self._lower.get(role_name.lower())
+            if canonical is not None:
+                info = self.roles[canonical]
+        return info
+
+    def description(self, role_name):
+        if not role_name:
+            return "No role assigned yet."
+        info = self.lookup(role_name)
+        if info is not None:
+            return info['description']
+        return f"You are a {role_name}. No specific description available for this role."
+
+    def faction(self, role_name):
+        if not role_name:
+            return ''
+        # check explicit mapping first
+        r = role_name.strip().lower()
+        if r in self.factions:
+            return self.factions[r]
+        # try partial match tokens
+        for key, val in self.factions.items():
+            if key in r:
+                return val
+        return ''
+
+    def descriptions(self):
+        """Flat roleName -> description mapping (for role_descriptions.json)."""
+        return {name: info['description'] for name, info in self.roles.items()}
+
+    def with_pack(self, pack):
+        """Return a view with a room's custom pack layered over this catalog."""
+        if not pack:
+            return self
+        return LayeredCatalog(pack, self)
+
+
+class LayeredCatalog:
+    """A room's custom pack over a base catalog; pack entries win. Neither is copied."""
+
+    __slots__ = ('pack', 'base')
+
+    def __init__(self, pack, base):
+        self.pack = pack
+        self.base = base
+
+    def __len__(self):
+        return len(self.base) + sum(1 for n in self.pack.roles if self.base.lookup(n) is None)
+
+    @property
+    def version(self):
+        return self.base.version
+
+    @property
+    def factions(self):
+        merged = dict(self.base.factions)
+        merged.update(self.pack.factions)
+        return merged
+
+    def lookup(self, role_name):
+        info = self.pack.lookup(role_name)
+        return info if info is not None else self.base.lookup(role_name)
+
+    def description(self, role_name):
+        if role_name and self.pack.lookup(role_name) is not None:
+            return self.pack.description(role_name)
+        return self.base.description(role_name)
+
+    def faction(self, role_name):
+        if not role_name:
+            return ''
+        # exact matches in either layer beat partial matches
+        r = role_name.strip().lower()
+        for layer in (self.pack, self.base):
+            if r in layer.factions:
+                return layer.factions[r]
+        return self.pack.faction(role_name) or self.base.faction(role_name)
+
+    def descriptions(self):
+        merged = self.base.descriptions()
+        merged.update(self.pack.descriptions())
+        return merged
+
+
+def parse_pack(data):
+    """Validate a host-supplied pack ({name: {description, faction}}) into a RoleCatalog.
+    Raises ValueError with a user-facing message.
+    """
+    if not isinstance(data, dict):
+        raise ValueError('Role pack must be an object of role name -> {description, faction}')
+    if len(data) > MAX_PACK_ROLES:
+        raise ValueError(f'Role pack may contain at most {MAX_PACK_ROLES} roles')
+    roles = {}
+    for name, info in data.items():
+        name = str(name).strip()
+        if not name or len(name) > MAX_ROLE_NAME:
+            raise ValueError(f'Role names must be 1-{MAX_ROLE_NAME} characters')
+        if isinstance(info, str):
+            info = {'description': info}
+        if not isinstance(info, dict):
+            raise ValueError(f'Invalid entry for role {name}')
+        description = str(info.get('description', ''))[:MAX_DESCRIPTION]
+        roles[name] = {'description': description, 'faction': str(info.get('faction') or '').strip()}
+    return RoleCatalog(roles)
+
+
+# ----------------- Current catalog -----------------
+_current = RoleCatalog({})
+# mtime of the last version of the file reload() read, parsed or not, so a broken file is
+# reported once per change rather than on every watcher tick
+_seen_mtime = None
+_reload_wanted = threading.Event()
+_watcher = None
+
+
+def current():
+    """The current base catalog. Lock-free; callers should read it once per request."""
+    return _current
+
+
+def reload(path=ROLES_PATH):
+    """Build a new catalog from path and swap it in. On error the previous catalog stays.
+    Returns the current catalog.
+    """
+    global _current, _seen_mtime
+    try:
+        mtime = _seen_mtime = os.stat(path).st_mtime
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        print("Warning: roles.json not found. Role data will be empty.")
+        return _current
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"Error parsing roles.json: {e}")
+        return _current
+    if not isinstance(data, dict):
+        print("Error parsing roles.json: top level must be an object")
+        return _current
+
+    _current = RoleCatalog(data, version=_current.version + 1, mtime=mtime)
+    print(f"Loaded {len(_current)} roles from roles.json")
+    return _current
+
+
+def request_reload():
+    """Ask the watcher thread to reload now (instead of reading disk on the caller's thread)."""
+    _reload_wanted.set()
+
+
+def _watch(path, interval):
+    while True:
+        forced = _reload_wanted.wait(interval)
+        _reload_wanted.clear()
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            continue
+        if forced or mtime != _seen_mtime:
+            reload(path)
+
+
+def start_watcher(path=ROLES_PATH, interval=WATCH_INTERVAL):
+    """Start the background thread that reloads path when it changes (idempotent)."""
+    global _watcher
+    if _watcher is not None:
+        return _watcher
+    _watcher = threading.Thread(target=_watch, args=(path, interval), name='roles-watcher', daemon=True)
+    _watcher.start()
+    return _watcher
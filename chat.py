@@ -0,0 +1,162 @@
+"""Compact in-memory chat log for a room.
+
+Messages are stored as __slots__ records with interned sender names; the
+sender color lives once in a per-log color table instead of on every
+message. Messages are turned back into the JSON dict shape the pages
+expect only when they leave the server (see ChatLog.to_json).
+
+Only the newest CHAT_HISTORY messages stay in memory. A log created with a
+ChatArchive hands older messages to it, and find() pages back through
+(and searches) the whole conversation; see chatarchive.py.
+"""
+import sys
+import time
+from collections import deque
+
+import chatarchive
+
+# Messages kept in memory per room
+CHAT_HISTORY = 1000
+
+SYSTEM_SENDER = 'SYSTEM'
+SYSTEM_COLOR = 'hsl(0,0%,50%)'
+
+
+class ChatMessage:
+    __slots__ = ('id', 'sender', 'text', 'ts', 'client_id', 'kind', 'target')
+
+    def __init__(self, id, sender, text, ts, client_id=None, kind=None, target=None):
+        self.id = id
+        self.sender = sender
+        self.text = text
+        self.ts = ts
+        self.client_id = client_id
+        self.kind = kind
+        self.target = target
+
+
+class ChatLog:
+    """Bounded chat history plus the per-sender color table. Callers hold the rooms lock."""
+
+    __slots__ = ('messages', 'next_id', 'colors', 'archive')
+
+    def __init__(self, maxlen=CHAT_HISTORY, archive=None):
+        self.messages = deque(maxlen=maxlen)
+        self.next_id = 1
+        # sender -> color for everyone who has posted, so old messages keep their color
+        self.colors = {SYSTEM_SENDER: SYSTEM_COLOR}
+        # where messages go when they leave the in-memory window (None = dropped)
+        self.archive = archive
+
+    def __len__(self):
+        return len(self.messages)
+
+    def append(self, sender, text, color=None, client_id=None, kind=None, target=None):
+        """Add a message and return it. color is recorded once per sender."""
+        sender = sys.intern(sender)
+        if color is not None and self.colors.get(sender) != color:
+            self.colors[sender] = color
+        msg = ChatMessage(self.next_id, sender, text, int(time.time()), client_id, kind, target)
+        self.next_id += 1
+        if self.archive is not None:
+            if len(self.messages) == self.messages.maxlen:
+                self.archive.evict(self.messages[0])
+            self.messages.append(msg)
+            self.archive.appended(msg)
+        else:
+            self.messages.append(msg)
+        return msg
+
+    def tail(self, n):
+        """Return the last n messages, oldest first."""
+        if n >= len(self.messages):
+            return list(self.messages)
+        return [self.messages[i] for i in range(len(self.messages) - n, len(self.messages))]
+
+    def since(self, last_id):
+        """Return messages with an id greater than last_id, oldest first."""
+        out = []
+        for msg in reversed(self.messages):
+            if msg.id <= last_id:
+                break
+            out.append(msg)
+        out.reverse()
+        return out
+
+    def find(self, before=None, limit=50, query=None, sender=None):
+        """Page back through the whole history: ids of up to limit messages with an id below before
+        (default: the newest), containing every word of query and sent by sender when those are
+        given. Returns (ids newest first, whether older matches exist). A search of an archived
+        log needs ChatArchive.ensure_index() first; fetch the messages with lookup() and
+        read_archived()."""
+        before = self.next_id if before is None else min(before, self.next_id)
+        words = list(chatarchive.tokenize(query))[:chatarchive.MAX_QUERY_TOKENS] if query else []
+        if words or sender:
+            if self.archive is not None:
+                ids = self.archive.match(before, limit + 1, words, sender)
+            else:
+                ids = self._scan(before, limit + 1, words, sender)
+        else:
+            oldest = self.archive.first_id if self.archive is not None else None
+            if oldest is None:
+                oldest = self.messages[0].id if self.messages else self.next_id
+            ids = range(before - 1, max(oldest, before - limit - 1) - 1, -1)
+        has_more = len(ids) > limit
+        return list(ids[:limit]), has_more
+
+    def lookup(self, ids):
+        """{id: ChatMessage} for the ids held in memory: the live window and the archive's
+        buffered records. The rest are on disk (read_archived)."""
+        first_in_memory = self.messages[0].id if self.messages else self.next_id
+        out = {i: self.messages[i - first_in_memory] for i in ids if i >= first_in_memory}
+        if self.archive is not None:
+            older = [i for i in ids if i < first_in_memory]
+            if older:
+                out.update((i, _from_record(rec)) for i, rec in self.archive.lookup(older).items())
+        return out
+
+    def read_archived(self, ids):
+        """{id: ChatMessage} for ids in the archive's segment files. Reads the disk, so call it
+        without holding the rooms lock."""
+        if self.archive is None or not ids:
+            return {}
+        return {i: _from_record(rec) for i, rec in self.archive.read(ids).items()}
+
+    def _scan(self, before, limit, words, sender):
+        """Matching ids in memory, newest first (a log without an archive has no index)."""
+        sender = sender.lower() if sender else None
+        words = set(words)
+        out = []
+        for msg in reversed(self.messages):
+            if len(out) >= limit:
+                break
+            if msg.id >= before:
+                continue
+            if sender is not None and msg.sender.lower() != sender:
+                continue
+            if words and not words <= chatarchive.tokenize(msg.text):
+                continue
+            out.append(msg.id)
+        return out
+
+    @property
+    def last_id(self):
+        return self.messages[-1].id if self.messages else 0
+
+    def to_json(self, msg):
+        """Serialize a message to the dict shape the chat clients expect."""
+        color = self.colors.get(msg.sender)
+        if msg.kind is not None:
+            return {'id': msg.id, 'sender': msg.sender, 'text': msg.text, 'ts': msg.ts,
+                    'type': msg.kind, 'target': msg.target, 'color': color}
+        return {'id': msg.id, 'sender': msg.sender, 'text': msg.text, 'ts': msg.ts,
+                'client_id': msg.client_id, 'color': color}
+
+    def to_json_list(self, msgs):
+        return [self.to_json(m) for m in msgs]
+
+
+def _from_record(rec):
+    # archived messages drop client_id (it only matters to the live stream)
+    msg_id, sender, text, ts, kind, target = rec
+    return ChatMessage(msg_id, sender, text, ts, None, kind, target)
@@ -0,0 +1,329 @@
+"""On-disk archive and search index for a room's chat history.
+
+A ChatLog keeps only its newest CHAT_HISTORY messages in memory. With a
+ChatArchive attached, messages that fall out of that window are buffered and
+written SEGMENT_SIZE at a time to a segment file: one compact JSON array per
+line, with each line's byte offset kept in memory. Message ids in a room are
+consecutive, so an archived message's line is id - first_id and reading an
+old page seeks straight to it instead of loading the history.
+
+The search index maps tokens and senders to sorted arrays of message ids
+over the whole history (archive and memory). A room's index is built on its
+first search, from the posting file written next to each segment and from the
+messages not yet written, so building it never parses archived message
+bodies. From then on each new message is indexed as it is appended.
+Rooms nobody searches never pay for an index.
+
+Nothing here touches the disk while the rooms lock is held: full batches are
+written (and archives deleted) by one background writer thread, segment reads
+and the index build happen outside the lock, and only the swap of a built
+index and the in-memory buffers are done under it. Each archive has its own
+directory, named from a digest of the room name plus a random suffix, so no
+room name can point it outside the archive root.
+"""
+import hashlib
+import json
+import os
+import queue
+import re
+import secrets
+import shutil
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+
+# Archived messages per segment file
+SEGMENT_SIZE = 256
+
+# Words in a query beyond this are ignored
+MAX_QUERY_TOKENS = 8
+
+_TOKEN_RE = re.compile(r'\w+')
+_DIR_RE = re.compile(r'^[0-9a-f]{16}-[0-9a-f]{8}$')
+
+
+def tokenize(text):
+    """Distinct lowercase word tokens of text."""
+    return set(_TOKEN_RE.findall(text.lower()))
+
+
+def _record(msg):
+    return (msg.id, msg.sender, msg.text, msg.ts, msg.kind, msg.target)
+
+
+def _inside(root, path):
+    """True if path is strictly below root once symlinks and '..' are resolved."""
+    root = os.path.realpath(root)
+    return os.path.realpath(path).startswith(root + os.sep)
+
+
+def _remove_tree(root, path):
+    if _inside(root, path):
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        print(f"Warning: refusing to delete {path}: not inside chat archive root {root}")
+
+
+class _Writer:
+    """One daemon thread running archive disk jobs in order. Started by the first submit()."""
+
+    def __init__(self):
+        self._jobs = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def submit(self, func, *args):
+        self._jobs.put((func, args))
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='chat-archive-writer',
+                                                    daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            func, args = self._jobs.get()
+            try:
+                func(*args)
+            except Exception as e:
+                print(f"[CHAT] archive job failed: {e}")
+
+
+writer = _Writer()
+
+
+def sweep(root, max_age):
+    """Delete archive directories under root untouched for max_age seconds (left behind by a
+    previous run; a room never outlives its TTL). Runs on the writer thread."""
+    def run():
+        try:
+            names = os.listdir(root)
+        except OSError:
+            return
+        cutoff = time.time() - max_age
+        for name in names:
+            path = os.path.join(root, name)
+            try:
+                stale = _DIR_RE.match(name) and os.path.getmtime(path) < cutoff
+            except OSError:
+                continue
+            if stale:
+                _remove_tree(root, path)
+    writer.submit(run)
+
+
+class Segment:
+    __slots__ = ('first_id', 'last_id', 'offsets', 'path')
+
+    def __init__(self, first_id, last_id, offsets, path):
+        self.first_id = first_id
+        self.last_id = last_id
+        self.offsets = offsets  # byte offset of each message's line, by id - first_id
+        self.path = path        # None when the batch could not be written (its messages are lost)
+
+
+class ChatArchive:
+    """Segments of archived messages and the lazily built search index for one room.
+
+    pending and the index are only touched under the rooms lock (callers hold it, except for
+    read() and ensure_index()). segments and sealing are shared with the writer thread and
+    guarded by the archive's own lock.
+    """
+
+    __slots__ = ('root', 'path', 'segments', 'sealing', 'pending', 'tokens', 'senders',
+                 'discarded', '_lock')
+
+    def __init__(self, root, room_name):
+        digest = hashlib.sha1(room_name.encode('utf-8')).hexdigest()[:16]
+        self.root = root
+        # the directory is created by the writer with the first segment
+        self.path = os.path.join(root, f'{digest}-{secrets.token_hex(4)}')
+        self.segments = []
+        self.sealing = []    # full batches of records handed to the writer, oldest first
+        self.pending = []    # archived records not yet in a batch, oldest first
+        self.tokens = None   # token -> array('I') of ids; None until the first search
+        self.senders = None  # lowercased sender -> array('I') of ids
+        self.discarded = False
+        self._lock = threading.Lock()
+
+    @property
+    def first_id(self):
+        """Oldest archived message id, or None when nothing has been archived."""
+        with self._lock:
+            if self.segments:
+                return self.segments[0].first_id
+            if self.sealing:
+                return self.sealing[0][0][0]
+        return self.pending[0][0] if self.pending else None
+
+    # ----- writes -----
+    def evict(self, msg):
+        """Take a message that fell out of the in-memory window."""
+        self.pending.append(_record(msg))
+        if len(self.pending) >= SEGMENT_SIZE:
+            records, self.pending = self.pending, []
+            with self._lock:
+                self.sealing.append(records)
+            writer.submit(self._seal, records)
+
+    def appended(self, msg):
+        """Index a new message (once the index exists)."""
+        if self.tokens is not None:
+            _index(self.tokens, self.senders, msg.id, msg.sender, msg.text)
+
+    def _seal(self, records):
+        """Writer thread: write one batch as a segment plus its posting file."""
+        if self.discarded:
+            return
+        first_id = records[0][0]
+        path = os.path.join(self.path, f'{first_id:010d}.seg')
+        offsets = array('Q')
+        postings = {}
+        senders = {}
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            with open(path, 'wb') as f:
+                for rec in records:
+                    offsets.append(f.tell())
+                    f.write(json.dumps(rec, separators=(',', ':')).encode() + b'\n')
+                    for token in tokenize(rec[2]):
+                        postings.setdefault(token, []).append(rec[0])
+                    senders.setdefault(rec[1].lower(), []).append(rec[0])
+            with open(path[:-4] + '.idx', 'w', encoding='utf-8') as f:
+                json.dump({'tokens': postings, 'senders': senders}, f, separators=(',', ':'))
+        except OSError as e:
+            # the batch is lost, as it was before archiving existed; reads skip its ids
+            print(f"Warning: could not write chat segment {path}: {e}")
+            path = offsets = None
+        with self._lock:
+            if self.discarded:
+                return  # the directory is deleted by the job queued after this one
+            self.segments.append(Segment(first_id, records[-1][0], offsets, path))
+            self.sealing.remove(records)
+
+    # ----- index -----
+    def ensure_index(self, rooms_lock, memory):
+        """Build the search index if it does not exist yet. Call without holding rooms_lock: the
+        segments' posting files are read outside it, and only the messages still in memory
+        (memory is the ChatLog's deque) are indexed under it before the index is swapped in."""
+        while self.tokens is None and not self.discarded:
+            with self._lock:
+                segments = list(self.segments)
+            tokens = {}
+            senders = {}
+            for seg in segments:
+                if seg.path is None:
+                    continue
+                try:
+                    with open(seg.path[:-4] + '.idx', 'r', encoding='utf-8') as f:
+                        data = json.load(f)
+                except (OSError, ValueError) as e:
+                    print(f"Warning: could not read chat index {seg.path}: {e}")
+                    continue
+                for table, postings in ((tokens, data['tokens']), (senders, data['senders'])):
+                    for key, ids in postings.items():
+                        table.setdefault(key, array('I')).extend(ids)
+            with rooms_lock:
+                if self.tokens is not None or self.discarded:
+                    return
+                with self._lock:
+                    if len(self.segments) != len(segments):
+                        continue  # a batch was written meanwhile: its records left memory, retry
+                    batches = list(self.sealing)
+                for records in batches + [self.pending]:
+                    for rec in records:
+                        _index(tokens, senders, rec[0], rec[1], rec[2])
+                for msg in memory:
+                    _index(tokens, senders, msg.id, msg.sender, msg.text)
+                self.tokens = tokens
+                self.senders = senders
+
+    def match(self, before, limit, query_tokens, sender=None):
+        """Ids (newest first, below before) of up to limit messages containing every token and,
+        if given, sent by sender. Needs ensure_index() first; matches nothing without an index."""
+        if self.tokens is None:
+            return []
+        lists = [self.tokens.get(t) for t in query_tokens]
+        if sender:
+            lists.append(self.senders.get(sender.lower()))
+        if not lists or any(ids is None for ids in lists):
+            return []
+        lists.sort(key=len)
+        base, rest = lists[0], lists[1:]
+        out = []
+        i = bisect_left(base, before) - 1
+        while i >= 0 and len(out) < limit:
+            msg_id = base[i]
+            if all(_contains(ids, msg_id) for ids in rest):
+                out.append(msg_id)
+            i -= 1
+        return out
+
+    # ----- reads -----
+    def lookup(self, ids):
+        """{id: record} for the ids still buffered in memory (pending or being written)."""
+        out = {}
+        with self._lock:
+            batches = list(self.sealing)
+        for records in batches + [self.pending]:
+            if not records:
+                continue
+            first = records[0][0]
+            for msg_id in ids:
+                if 0 <= msg_id - first < len(records):
+                    out[msg_id] = records[msg_id - first]
+        return out
+
+    def read(self, ids):
+        """{id: record} for the ids found in written segments. Reads the disk; call without holding
+        the rooms lock. Ids that cannot be read are left out."""
+        with self._lock:
+            segments = list(self.segments)
+        first_ids = [seg.first_id for seg in segments]
+        wanted = {}
+        for msg_id in ids:
+            k = bisect_right(first_ids, msg_id) - 1
+            if k >= 0 and msg_id <= segments[k].last_id and segments[k].path is not None:
+                wanted.setdefault(k, []).append(msg_id)
+        out = {}
+        for k, seg_ids in wanted.items():
+            seg = segments[k]
+            try:
+                with open(seg.path, 'rb') as f:
+                    for msg_id in sorted(seg_ids):
+                        f.seek(seg.offsets[msg_id - seg.first_id])
+                        out[msg_id] = tuple(json.loads(f.readline()))
+            except (OSError, ValueError) as e:
+                print(f"Warning: could not read chat segment {seg.path}: {e}")
+        return out
+
+    def discard(self):
+        """Forget the archive and have the writer delete its directory (the room expired)."""
+        self.discarded = True
+        with self._lock:
+            self.segments = []
+            self.sealing = []
+        self.pending = []
+        self.tokens = None
+        self.senders = None
+        writer.submit(_remove_tree, self.root, self.path)
+
+
+def _index(tokens, senders, msg_id, sender, text):
+    for token in tokenize(text):
+        ids = tokens.get(token)
+        if ids is None:
+            ids = tokens[token] = array('I')
+        ids.append(msg_id)
+    key = sender.lower()
+    ids = senders.get(key)
+    if ids is None:
+        ids = senders[key] = array('I')
+    ids.append(msg_id)
+
+
+def _contains(ids, msg_id):
+    i = bisect_left(ids, msg_id)
+    return i < len(ids) and ids[i] == msg_id
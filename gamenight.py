@@ -0,0 +1,154 @@
+"""Multi-table events ("game nights").
+
+A GameNight groups several rooms (its tables) under one organizer and keeps
+one small summary per table for the organizer's dashboard. Summaries are
+rebuilt only for tables that changed: a _TableWatcher subscribed to each
+table's RoomHub (state and phase changes) and VoteTally (vote opened or
+closed) marks the table dirty, and refresh() re-summarizes just the dirty
+tables instead of walking every room on each request.
+
+Every summary that actually changes is stamped with the event's next
+version, so a dashboard can ask for only the tables changed since the
+version it already has (status(since=...)); the full status is encoded to
+JSON once per version and shared by every reader.
+"""
+import json
+import threading
+
+
+class _TableWatcher:
+    """Subscriber on a table's RoomHub and VoteTally. push() runs on the publisher's thread
+    (possibly under the rooms lock or the tally lock), so it only marks the table dirty."""
+
+    __slots__ = ('night', 'room_name')
+
+    def __init__(self, night, room_name):
+        self.night = night
+        self.room_name = room_name
+
+    def push(self, item):
+        if isinstance(item, tuple):
+            # RoomHub: (channel, payload); chat does not change the summary
+            if item[0] not in ('state', 'phase'):
+                return
+        elif item.get('type') not in ('open', 'closed'):
+            # VoteTally: individual votes do not change the summary either
+            return
+        self.night.mark_dirty(self.room_name)
+
+
+class GameNight:
+    """One event: its organizer credentials, tables and per-table summaries."""
+
+    def __init__(self, name, password, token, created_at):
+        self.name = name
+        self.password = password
+        self.token = token
+        self.created_at = created_at
+        self.tables = []        # room names, in the order they were added
+        self.version = 0
+        self._cond = threading.Condition()
+        self._dirty = set()
+        self._summaries = {}    # room name -> summary dict
+        self._changed_at = {}   # room name -> version its summary last changed at
+        self._removed = {}      # room name -> version it was removed at (for since= deltas)
+        self._watchers = {}     # room name -> (watcher, hub, tally)
+        self._encoded = (-1, b'')
+
+    # ----- tables -----
+    def add_table(self, room_name, hub, tally):
+        """Start tracking a room as one of this event's tables. Caller should hold the rooms lock."""
+        with self._cond:
+            if room_name in self._watchers:
+                return
+            watcher = _TableWatcher(self, room_name)
+            self._watchers[room_name] = (watcher, hub, tally)
+            self.tables.append(room_name)
+            self._removed.pop(room_name, None)
+            self._dirty.add(room_name)
+            self._cond.notify_all()
+        hub.subscribe(watcher)
+        tally.subscribe(watcher)
+
+    def remove_table(self, room_name):
+        """Stop tracking a table (detached or expired). Caller should hold the rooms lock."""
+        with self._cond:
+            entry = self._watchers.pop(room_name, None)
+            if entry is None:
+                return
+            self.tables.remove(room_name)
+            self._summaries.pop(room_name, None)
+            self._changed_at.pop(room_name, None)
+            self._dirty.discard(room_name)
+            self.version += 1
+            self._removed[room_name] = self.version
+            self._cond.notify_all()
+        watcher, hub, tally = entry
+        hub.unsubscribe(watcher)
+        tally.unsubscribe(watcher)
+
+    def detach_all(self):
+        """Unsubscribe from every table (the event expired). Caller should hold the rooms lock."""
+        for room_name in list(self.tables):
+            self.remove_table(room_name)
+
+    def mark_dirty(self, room_name):
+        with self._cond:
+            if room_name in self._watchers:
+                self._dirty.add(room_name)
+                self._cond.notify_all()
+
+    # ----- summaries -----
+    def refresh(self, summarize):
+        """Re-summarize the tables that changed since the last refresh with summarize(room_name),
+        which returns a summary dict or None when the room no longer exists.
+        Caller should hold the rooms lock (which also serializes refreshes). Returns the version.
+        """
+        with self._cond:
+            dirty, self._dirty = self._dirty, set()
+        # summarize outside our own lock: tally/hub publishers call mark_dirty while holding theirs
+        fresh = {name: summarize(name) for name in dirty}
+        for name, summary in fresh.items():
+            if summary is None:
+                self.remove_table(name)
+        with self._cond:
+            for name, summary in fresh.items():
+                if summary is None or name not in self._watchers:
+                    continue
+                if summary != self._summaries.get(name):
+                    self.version += 1
+                    self._summaries[name] = summary
+                    self._changed_at[name] = self.version
+            return self.version
+
+    def status(self, since=None):
+        """The event's status: every table's summary, or with since= only the tables changed
+        (and the names of tables removed) after that version. Call refresh() first."""
+        with self._cond:
+            if since is None:
+                tables = [self._summaries[n] for n in self.tables if n in self._summaries]
+                return {'event': self.name, 'version': self.version, 'tables': tables}
+            tables = [self._summaries[n] for n in self.tables
+                      if n in self._summaries and self._changed_at[n] > since]
+            removed = [n for n, v in self._removed.items() if v > since]
+            return {'event': self.name, 'version': self.version, 'since': since,
+                    'tables': tables, 'removed': removed}
+
+    def status_json(self):
+        """status() encoded as JSON bytes, cached until the version changes. Call refresh() first."""
+        with self._cond:
+            version, data = self._encoded
+            if version == self.version:
+                return version, data
+        status = self.status()
+        data = json.dumps(status).encode()
+        with self._cond:
+            self._encoded = (status['version'], data)
+        return status['version'], data
+
+    def wait(self, version, timeout):
+        """Block until a table is dirty or the version moved past version. Returns True if so."""
+        with self._cond:
+            if not self._dirty and self.version == version:
+                self._cond.wait(timeout)
+            return bool(self._dirty) or self.version != version
@@ -1,11 +1,24 @@
 
 import os
 import json
+import hashlib
+import tempfile
 from flask import Flask, request, jsonify, redirect, url_for, render_template, make_response, session, Response
 from threading import Lock
-from flask import send_from_directory
-
-app = Flask(__name__)
+import balance
+import voting
+import chat
+import chatarchive
+import memstats
+import assets
+import catalog
+import realtime
+import roomlog
+import gamenight
+import phases
+
+# static files are served by assets.send_static (hashed, immutable build copies)
+app = Flask(__name__, static_folder=None)
 app.secret_key = os.environ.get('SECRET_KEY', 'your-secret-key-change-this-in-production')
 
 # In-memory store (resets when the server restarts)
@@ -14,8 +27,8 @@ app.secret_key = os.environ.get('SECRET_KEY', 'your-secret-key-change-this-in-pr
 #   players: [{name, session_id}], roles: [{name,count}], assignments: {player: role}, game_started
 # }
 rooms = {}
-roles_data = {}
-factions_map = {}
+# events: map event_name -> gamenight.GameNight (multi-table events; tables are rooms)
+events = {}
 lock = Lock()
 
 # Room lifetime (seconds) - Extended to 4 hours
@@ -24,44 +37,23 @@ ROOM_TTL = int(os.environ.get('ROOM_TTL_SECONDS', 4 * 60 * 60))  # default 4 hou
 # Cookie lifetime - Set to match room lifetime for consistency
 COOKIE_TTL = ROOM_TTL  # 4 hours
 
-def load_roles_data():
-    """Load a merged roles.json file containing description and faction for each role.
-    Populates roles_data and a quick lookup factions_map (lowercased keys).
-    """
-    global roles_data, factions_map
-    try:
-        with open('roles.json', 'r', encoding='utf-8') as f:
-            roles_data = json.load(f)
-        print(f"Loaded {len(roles_data)} roles from roles.json")
-    except FileNotFoundError:
-        print("Warning: roles.json not found. Role data will be empty.")
-        roles_data = {}
-    except json.JSONDecodeError as e:
-        print(f"Error parsing roles.json: {e}")
-        roles_data = {}
-
-    # Build factions_map from roles_data for quick lookup (normalize keys)
-    factions_map = {}
-    for name, info in roles_data.items():
-        if isinstance(info, dict):
-            faction = info.get('faction') or ''
-            factions_map[name.lower()] = faction
+# Directory for per-room event journals; rooms are restored from it on startup. Unset = memory only.
+ROOM_LOG_DIR = os.environ.get('ROOM_LOG_DIR')
 
-# Get role description (case insensitive)
-def get_role_description(role_name):
-    if not role_name:
-        return "No role assigned yet."
-    # exact match in roles_data (case sensitive first)
-    if role_name in roles_data and isinstance(roles_data[role_name], dict):
-        return roles_data[role_name].get('description', '')
+# Directory for chat that scrolled out of memory (one subdirectory per room, deleted with the room)
+CHAT_ARCHIVE_DIR = os.environ.get('CHAT_ARCHIVE_DIR') or os.path.join(tempfile.gettempdir(), 'mafia-chat')
 
-    # case-insensitive search
-    rn = role_name.lower()
-    for k, v in roles_data.items():
-        if k.lower() == rn and isinstance(v, dict):
-            return v.get('description', '')
+def role_catalog(room=None):
+    """The role catalog to use for a request: the current base catalog (see catalog.py),
+    with the room's custom role pack layered on top when it has one. Lock-free."""
+    base = catalog.current()
+    if room is not None:
+        return base.with_pack(room.get('role_pack'))
+    return base
 
-    return f"You are a {role_name}. No specific description available for this role."
+# Get role description (case insensitive)
+def get_role_description(role_name, room=None):
+    return role_catalog(room).description(role_name)
 
 # Add this helper function after the imports
 def get_device_id():
@@ -102,22 +94,20 @@ def make_response_with_device_cookie(template_or_redirect, **kwargs):
     resp.set_cookie('device_id', device_id, max_age=COOKIE_TTL)  # Use COOKIE_TTL
     return resp
 
-# Load descriptions on startup
-load_roles_data()
+# Load descriptions on startup, then reload in the background whenever roles.json changes
+catalog.reload()
+catalog.start_watcher()
 
+# Build hashed static assets (no-op when static/ is unchanged) and expose the URL helpers to templates
+try:
+    assets.build()
+except OSError as e:
+    print(f"Warning: could not build static assets: {e}")
+app.jinja_env.globals.update(asset_url=assets.asset_url, bg_image_set=assets.bg_image_set)
 
-def get_faction_for_role(role_name):
-    if not role_name:
-        return ''
-    # check explicit mapping first
-    r = role_name.strip().lower()
-    if r in factions_map:
-        return factions_map[r]
-    # try partial match tokens
-    for key, val in factions_map.items():
-        if key in r:
-            return val
-    return ''
+
+def get_faction_for_role(role_name, room=None):
+    return role_catalog(room).faction(role_name)
 
 # ----------------- Routes -----------------
 @app.route("/", methods=["GET"])
@@ -146,14 +136,20 @@ def home():
                     # Device matches the player - check if game started and role assigned
                     if room.get('game_started') and player_name in room.get('assignments', {}):
                         role = room['assignments'][player_name]
-                        description = get_role_description(role)
+                        description = get_role_description(role, room)
                         # faction: prefer assignment_factions if present, else try auto-detect
-                        faction = room.get('assignment_factions', {}).get(player_name) or get_faction_for_role(role)
+                        faction = room.get('assignment_factions', {}).get(player_name) or get_faction_for_role(role, room)
                         return make_response_with_device_cookie('role.html', name=player_name, role=role, description=description, faction=faction, room_name=room_name, player_ip=player_ip)
                     else:
                         # Game not started yet or no role assigned, show thanks page
                         return make_response_with_device_cookie('thanks.html', name=player_name, room_name=room_name, player_ip=player_ip)
                 else:
+                    # The organizer may have moved this player to another table of the room's event
+                    moved_to = _event_table_for_device(room, player_name, player_ip)
+                    if moved_to:
+                        resp = make_response_with_device_cookie('thanks.html', name=player_name, room_name=moved_to, player_ip=player_ip)
+                        resp.set_cookie('room_name', moved_to, max_age=COOKIE_TTL)
+                        return resp
                     # Device doesn't match or player not in room - clear invalid cookies
                     response = make_response_with_device_cookie('home.html', error="Session invalid - please rejoin the room")
                     response.set_cookie('player_name', '', expires=0)
@@ -175,20 +171,32 @@ def get_room_or_404(room_name):
         if not room:
             return None
         if _room_expired(room):
-            # destroy room
+            # destroy room (and its journal)
             rooms.pop(room_name, None)
+            if room.get('log') is not None:
+                room['log'].discard()
+            if getattr(room.get('chat'), 'archive', None) is not None:
+                room['chat'].archive.discard()
+            if room.get('phase') is not None:
+                room['phase'].stop()
+            # its event drops the table on the next refresh
+            night = events.get(room.get('event'))
+            if night is not None:
+                night.mark_dirty(room_name)
             return None
         return room
 
 
 def _assign_chat_color_for_player(room, player_name):
-    """Ensure a color is assigned for player_name in room. Thread-safe caller should hold lock."""
-    if 'chat_colors' not in room:
-        room['chat_colors'] = {}
-    if player_name in room['chat_colors']:
-        return room['chat_colors'][player_name]
+    """Ensure a color is assigned for player_name in the room's chat color table (ChatLog.colors,
+    the only one per room). Thread-safe caller should hold lock."""
+    colors = _chat_log(room).colors
+    if player_name in colors:
+        return colors[player_name]
 
     hue = None
+    # Prefer to pop a hue from the room-specific shuffled high-contrast palette,
+    # falling back to a deterministic hue once it is exhausted
     if room.get('chat_palette') and len(room.get('chat_palette')):
         hue = room['chat_palette'].pop(0)
     if hue is None:
@@ -197,9 +205,250 @@ def _assign_chat_color_for_player(room, player_name):
             h = (h * 31 + ord(ch)) % 360
         hue = h
     col = f'hsl({hue},85%,45%)'
-    room['chat_colors'][player_name] = col
+    colors[player_name] = col
     return col
 
+def _chat_log(room):
+    """Return the room's ChatLog, creating it if missing. Caller should hold lock."""
+    log = room.get('chat')
+    if not isinstance(log, chat.ChatLog):
+        log = room['chat'] = chat.ChatLog()
+    return log
+
+
+def _room_hub(room):
+    """Return the room's RoomHub (change notifications), creating it if missing. Safe without holding lock."""
+    hub = room.get('hub')
+    if hub is None:
+        hub = room.setdefault('hub', realtime.RoomHub())
+    return hub
+
+
+def _chat_feed(room):
+    """Return the room's encode-once SSE chat feed, creating it from the chat log on first use.
+    Caller should hold lock."""
+    feed = room.get('chat_feed')
+    if feed is None:
+        log = _chat_log(room)
+        feed = room['chat_feed'] = realtime.ChatFeed(log.to_json_list(log.tail(realtime.SSE_BACKLOG)))
+    return feed
+
+
+def _publish_chat(room, msg):
+    """Send a new chat message (JSON dict) to live subscribers. Caller should hold lock."""
+    _room_hub(room).publish('chat', msg)
+    # rooms nobody has streamed chat from have no feed yet; it is seeded from the log when needed
+    feed = room.get('chat_feed')
+    if feed is not None:
+        feed.publish(msg)
+
+
+def _room_log(room):
+    """Return the room's RoomLog, creating it if missing. Caller should hold lock."""
+    log = room.get('log')
+    if log is None:
+        log = room['log'] = roomlog.RoomLog()
+    return log
+
+
+def _record(room, kind, **data):
+    """Apply a game-state change to room by appending it to the room's event log, and tell live
+    subscribers. Every change to players/roles/assignments/game flags goes through here (or
+    undo/redo). Caller should hold lock. Returns the Event."""
+    event = _room_log(room).record(room, kind, data)
+    _room_hub(room).state_changed(event.seq)
+    return event
+
+
+def _vote_tally(room):
+    """Return the room's VoteTally, creating it if missing. Safe without holding lock."""
+    tally = room.get('vote')
+    if tally is None:
+        tally = room.setdefault('vote', voting.VoteTally())
+    return tally
+
+
+def _alive_players(room):
+    """Names of assigned players who are still in the game. Caller should hold lock."""
+    eliminated = set(room.get('eliminated_players', []))
+    return [p['name'] for p in room['players']
+            if p['name'] in room.get('assignments', {}) and p['name'] not in eliminated]
+
+
+def _resync_vote(room):
+    """After undo/redo, match an open day vote to the living players (an undone kill brings a
+    player back, a redone one removes them again); cancel it if the game is no longer on or
+    fewer than two are left. Caller should hold lock."""
+    tally = _vote_tally(room)
+    if not tally.open:
+        return
+    alive = _alive_players(room)
+    if room.get('game_started') and len(alive) >= 2:
+        tally.set_players(alive, alive)
+    else:
+        tally.cancel()
+
+
+def _phase_clock(room_name, room):
+    """Return the room's round clock (see phases.py), creating it if missing. Caller should hold lock."""
+    clock = room.get('phase')
+    if clock is None:
+        import functools
+        clock = room['phase'] = phases.PhaseClock(functools.partial(_phase_deadline, room_name))
+    return clock
+
+
+def _publish_phase(room):
+    """Push the room's clock to live clients. Caller should hold lock. Returns the snapshot sent."""
+    import time
+    snap = dict(room['phase'].snapshot(), server_time=time.time())
+    _room_hub(room).publish('phase', snap)
+    return snap
+
+
+def _enter_phase(room, phase):
+    """Move the room's clock to phase. Leaving the vote phase closes the day vote (a sole leader
+    is eliminated, as with vote/close?eliminate=1); entering it opens one for the living players,
+    or ends the rounds when fewer than two are left. Caller should hold lock."""
+    clock = room['phase']
+    tally = _vote_tally(room)
+    if clock.phase == 'vote' and tally.open:
+        try:
+            result = tally.close()
+        except voting.VoteError:
+            result = None
+        if result and result['winner']:
+            _eliminate_player(room, result['winner'], via='vote')
+    if phase == 'vote':
+        alive = _alive_players(room)
+        if len(alive) < 2:
+            phase = 'lobby'
+        else:
+            tally.start(alive, alive)
+    clock.enter(phase)
+    return _publish_phase(room)
+
+
+def _stop_phases(room):
+    """Send the room's clock back to the lobby, if it is running (host stop, game restarted or
+    reset, nothing left to time). A day vote the vote phase opened is cancelled with it.
+    Caller should hold lock. Returns the snapshot published, or None if the clock was idle."""
+    clock = room.get('phase')
+    if clock is None or not clock.running:
+        return None
+    if clock.phase == 'vote':
+        _vote_tally(room).cancel()
+    clock.stop()
+    return _publish_phase(room)
+
+
+def _phase_deadline(room_name, clock):
+    """Scheduler callback (runs on the phases scheduler thread): room_name's current phase ran out."""
+    import time
+    with lock:
+        room = rooms.get(room_name)
+        if room is None or room.get('phase') is not clock or not clock.due(time.time()):
+            # paused, extended or skipped since this timer was set, or the room is gone
+            return
+        if not room.get('game_started'):
+            # e.g. the assignment was undone: nothing left to time
+            _stop_phases(room)
+            return
+        snap = _enter_phase(room, clock.next_phase())
+    print(f"[PHASE] room={room_name} phase={snap['phase']} round={snap['round']}")
+
+
+def _eliminate_player(room, player_name, via=None):
+    """Mark player_name as eliminated (via='vote' when a day vote decided it). Caller should hold lock.
+    Returns None on success or an (error message, status code) tuple.
+    """
+    # Check if game has started
+    if not room.get('game_started', False):
+        return 'Game has not started yet', 400
+
+    # Check if player exists in the room
+    player_exists = any(p['name'] == player_name for p in room['players'])
+    if not player_exists:
+        return 'Player not found in room', 404
+
+    # Initialize eliminated_players list if it doesn't exist
+    if 'eliminated_players' not in room:
+        room['eliminated_players'] = []
+
+    # Check if player is already eliminated
+    if player_name in room['eliminated_players']:
+        return 'Player is already eliminated', 400
+
+    # Add player to eliminated list
+    _record(room, 'kill', name=player_name, via=via)
+    return None
+
+def _journal_path(room_name):
+    from urllib.parse import quote
+    return os.path.join(ROOM_LOG_DIR, quote(room_name, safe='') + '.jsonl')
+
+
+def _new_chat_log(room_name):
+    """A ChatLog that archives older messages under CHAT_ARCHIVE_DIR (created on first use)."""
+    return chat.ChatLog(archive=chatarchive.ChatArchive(CHAT_ARCHIVE_DIR, room_name))
+
+
+def _chat_history(room, before, limit, query, sender):
+    """One page of a room's whole chat history (see ChatLog.find). Takes lock itself: the
+    archive's search index and segments are read from disk outside it.
+    Returns (message dicts oldest first, has_more, cursor for the next page)."""
+    with lock:
+        log = _chat_log(room)
+    if log.archive is not None and (query or sender):
+        log.archive.ensure_index(lock, log.messages)
+    with lock:
+        ids, has_more = log.find(before=before, limit=limit, query=query, sender=sender)
+        found = log.lookup(ids)
+    found.update(log.read_archived([i for i in ids if i not in found]))
+    with lock:
+        msgs = [log.to_json(found[i]) for i in reversed(ids) if i in found]
+    return msgs, has_more, (ids[-1] if has_more else None)
+
+
+def _new_room(room_name, host_password, host_token, created_at, journal=True):
+    """Build the dict for a new, empty room. With ROOM_LOG_DIR set its event log is journaled to disk
+    (journal=False when the caller restores an existing journal instead)."""
+    # prepare a shuffled high-contrast palette for chat colors
+    import secrets
+    from array import array
+    PALETTE_SIZE = 24
+    base_hues = [int(i * (360 / PALETTE_SIZE)) for i in range(PALETTE_SIZE)]
+    rnd = secrets.SystemRandom()
+    rnd.shuffle(base_hues)
+
+    room = {
+        'host_password': host_password,
+        'player_password': None,
+        'host_token': host_token,
+        'created_at': created_at,
+        'players': [],
+        'roles': [],
+        'assignments': {},
+        'game_started': False,
+        'eliminated_players': [],
+        # chat internals (compact message records; see chat.py, chatarchive.py)
+        'chat': _new_chat_log(room_name),
+        # a shuffled palette of high-contrast hues to assign per-sender
+        'chat_palette': array('H', base_hues),  # pop from this when assigning new senders
+        # day-vote tallies (own lock; see voting.py)
+        'vote': voting.VoteTally(),
+        # live change notifications (see realtime.py)
+        'hub': realtime.RoomHub()
+    }
+    # event log every game-state change goes through (see roomlog.py)
+    if ROOM_LOG_DIR and journal:
+        header = {'room': room_name, 'host_password': host_password, 'host_token': host_token,
+                  'created_at': created_at}
+        room['log'] = roomlog.RoomLog(journal=_journal_path(room_name), header=header)
+    else:
+        room['log'] = roomlog.RoomLog()
+    return room
+
 @app.route("/create_room", methods=["GET", "POST"])
 def create_room():
     # Host creates a room with a host password
@@ -218,31 +467,7 @@ def create_room():
 
         import time, secrets
         host_token = secrets.token_urlsafe(16)
-    # prepare a shuffled high-contrast palette for chat colors
-    import secrets
-    PALETTE_SIZE = 24
-    base_hues = [int(i * (360 / PALETTE_SIZE)) for i in range(PALETTE_SIZE)]
-    rnd = secrets.SystemRandom()
-    rnd.shuffle(base_hues)
-
-    rooms[room_name] = {
-            'host_password': host_password,
-            'player_password': None,
-            'host_token': host_token,
-            'created_at': time.time(),
-            'players': [],
-            'roles': [],
-            'assignments': {},
-            'game_started': False,
-            'eliminated_players': [],
-            # chat internals
-            'chat': [],
-            'chat_next_id': 1,
-            'chat_colors': {},
-            # a shuffled palette of high-contrast hues to assign per-sender
-            'chat_palette': base_hues[:],  # pop from this when assigning new senders
-            'chat_palette_orig': base_hues[:]
-        }
+        rooms[room_name] = _new_room(room_name, host_password, host_token, time.time())
 
     # Set host cookie to allow host access (4 hours)
     resp = make_response(redirect(url_for('host_dashboard', room_name=room_name)))
@@ -363,9 +588,9 @@ def join_room(room_name):
             return redirect(url_for('join_page', room_name=room_name, error='Name already taken'))
 
         # Add new player with device ID (only if device hasn't joined before)
-    room['players'].append({'name': name, 'device_id': player_ip})
-    # Pre-assign a chat color for this player to avoid flash on first message
-    _assign_chat_color_for_player(room, name)
+        _record(room, 'join', name=name, device_id=player_ip)
+        # Pre-assign a chat color for this player to avoid flash on first message
+        _assign_chat_color_for_player(room, name)
 
     resp = make_response_with_device_cookie('thanks.html', name=name, room_name=room_name, player_ip=player_ip)
     resp.set_cookie('player_name', name, max_age=COOKIE_TTL)      # Changed from ROOM_TTL
@@ -388,13 +613,79 @@ def api_set_player_password(room_name):
 
     password = request.form.get('password', '').strip()
     with lock:
-        if password:
-            room['player_password'] = password
-        else:
-            room['player_password'] = None
+        _record(room, 'set_password', password=password or None)
 
     return jsonify({'success': True, 'password_set': room['player_password'] is not None})
 
+def _requester_name(room):
+    """Name of the player making the request: the player_name cookie, else the device mapping.
+    Caller should hold lock and be inside a request context. Returns None for non-players.
+    """
+    requester = request.cookies.get('player_name')
+    if not requester:
+        device_id = get_device_id()
+        for p in room.get('players', []):
+            if p.get('device_id') == device_id:
+                requester = p['name']
+                break
+    return requester
+
+def _session_player(room):
+    """Name of the player whose session this is: the player_name cookie, but only if that player
+    joined the room from this device (the check home() makes). Caller should hold lock and be
+    inside a request context. Returns None otherwise."""
+    name = request.cookies.get('player_name')
+    if not name:
+        return None
+    device_id = get_device_id()
+    if any(p['name'] == name and p.get('device_id') == device_id for p in room['players']):
+        return name
+    return None
+
+def _players_payload(room):
+    """Room status as seen by the requesting player (the /players payload).
+    Caller should hold lock and be inside a request context. Returns copies, not live room data.
+    """
+    # Basic room info
+    data = {
+        'players': [p['name'] for p in room['players']],
+        'count': len(room['players']),
+        'password_set': room.get('player_password') is not None,
+        'game_started': room.get('game_started', False),
+        'assignments': dict(room['assignments']) if room.get('game_started') else {},
+        'eliminated_players': list(room.get('eliminated_players', [])),
+        'chat_colors': dict(_chat_log(room).colors),
+        'roles': [dict(r) for r in room.get('roles', [])],
+        # round clock (absolute deadline, so clients resume their countdown after a reconnect)
+        'phase': room['phase'].snapshot() if room.get('phase') is not None else None
+    }
+
+    # Determine the requesting player (prefer player_name cookie, fallback to device mapping)
+    requester = _requester_name(room)
+
+    # Provide visible roles tailored to the requesting player (e.g., mafia see other mafias and their roles)
+    visible = []
+    if data['game_started'] and requester and requester in room.get('assignments', {}):
+        # ensure assignment_factions exists
+        assignment_factions = room.get('assignment_factions', {})
+        # one catalog snapshot for the whole request
+        roles_catalog = role_catalog(room)
+        requester_faction = assignment_factions.get(requester) or roles_catalog.faction(room['assignments'].get(requester))
+
+        if requester_faction and requester_faction.lower() == 'mafia':
+            # collect all players whose assigned faction is Mafia
+            for player_name, assigned_role in room.get('assignments', {}).items():
+                pf = assignment_factions.get(player_name) or roles_catalog.faction(assigned_role)
+                if pf and pf.lower() == 'mafia':
+                    visible.append({
+                        'name': player_name,
+                        'role': assigned_role,
+                        'faction': pf
+                    })
+
+    data['visible_roles'] = visible
+    return data
+
 @app.route('/api/rooms/<room_name>/players', methods=['GET'])
 def api_players(room_name):
     room = get_room_or_404(room_name)
@@ -402,47 +693,79 @@ def api_players(room_name):
         return jsonify({'error': 'Room not found or expired'}), 404
 
     with lock:
-        # Basic room info
-        data = {
-            'players': [p['name'] for p in room['players']],
-            'count': len(room['players']),
-            'password_set': room.get('player_password') is not None,
-            'game_started': room.get('game_started', False),
-            'assignments': room['assignments'] if room.get('game_started') else {},
-            'eliminated_players': room.get('eliminated_players', []),
-            'chat_colors': room.get('chat_colors', {}),
-            'roles': room.get('roles', [])
-        }
+        data = _players_payload(room)
+    return jsonify(data)
 
-        # Determine the requesting player (prefer player_name cookie, fallback to device mapping)
-        requester = request.cookies.get('player_name')
-        if not requester:
-            device_id = get_device_id()
-            for p in room.get('players', []):
-                if p.get('device_id') == device_id:
-                    requester = p['name']
-                    break
+@app.route('/api/rooms/<room_name>/bootstrap', methods=['GET'])
+def api_bootstrap(room_name):
+    """Everything a player page needs on load in one response: who the requester is, their role
+    and visible teammates, room state, recent chat, the vote and role metadata.
+    'cursor' tells the live streams where to continue (chat/stream?after=, ws?after=).
+    Responses carry an ETag built from the room's versions, so an unchanged room answers 304.
+    """
+    room = get_room_or_404(room_name)
+    if not room:
+        return jsonify({'error': 'Room not found or expired'}), 404
 
-        # Provide visible roles tailored to the requesting player (e.g., mafia see other mafias and their roles)
-        visible = []
-        if data['game_started'] and requester and requester in room.get('assignments', {}):
-            # ensure assignment_factions exists
-            assignment_factions = room.get('assignment_factions', {})
-            requester_faction = assignment_factions.get(requester) or get_faction_for_role(room['assignments'].get(requester))
-
-            if requester_faction and requester_faction.lower() == 'mafia':
-                # collect all players whose assigned faction is Mafia
-                for player_name, assigned_role in room.get('assignments', {}).items():
-                    pf = assignment_factions.get(player_name) or get_faction_for_role(assigned_role)
-                    if pf and pf.lower() == 'mafia':
-                        visible.append({
-                            'name': player_name,
-                            'role': assigned_role,
-                            'faction': pf
-                        })
-
-        data['visible_roles'] = visible
-    return jsonify(data)
+    hub = _room_hub(room)
+    tally = _vote_tally(room)
+    roles_catalog = role_catalog(room)
+    host_token = request.cookies.get('host_token')
+    is_host = bool(host_token) and request.cookies.get('host_room') == room_name and host_token == room.get('host_token')
+
+    with lock:
+        requester = _requester_name(room)
+        log = _chat_log(room)
+        cursor = {
+            'state_version': hub.state_version,
+            'chat_id': log.last_id,
+            'vote_version': tally.version,
+        }
+        phase_version = room['phase'].version if room.get('phase') is not None else 0
+        etag = '{}-{}-{}-{}-{}-{}-{}'.format(
+            hub.state_version, log.last_id, tally.version, roles_catalog.version, phase_version,
+            int(is_host), hashlib.sha1((requester or '').encode()).hexdigest()[:8])
+        if request.if_none_match.contains(etag):
+            resp = make_response('', 304)
+        else:
+            state = _players_payload(room)
+            chat_backlog = log.to_json_list(log.tail(200))
+            me = {
+                'name': requester,
+                'is_host': is_host,
+                'joined': any(p['name'] == requester for p in room['players']),
+                'eliminated': requester in room.get('eliminated_players', []),
+                'role': None,
+                'description': None,
+                'faction': None,
+            }
+            if room.get('game_started') and requester in room.get('assignments', {}):
+                role = room['assignments'][requester]
+                me['role'] = role
+                me['description'] = roles_catalog.description(role)
+                me['faction'] = room.get('assignment_factions', {}).get(requester) or roles_catalog.faction(role)
+            resp = None
+
+    if resp is None:
+        resp = jsonify({
+            'room': room_name,
+            'me': me,
+            'state': state,
+            'chat': chat_backlog,
+            'vote': tally.snapshot(),
+            'roles': {
+                'version': roles_catalog.version,
+                'descriptions': roles_catalog.descriptions(),
+                'factions': dict(roles_catalog.factions),
+            },
+            'cursor': cursor,
+        })
+    # per-viewer content: cache in the browser/webview only, and always revalidate
+    resp.set_etag(etag)
+    resp.cache_control.private = True
+    resp.cache_control.no_cache = True
+    resp.vary.add('Cookie')
+    return resp
 
 @app.route('/api/rooms/<room_name>/roles', methods=['POST'])
 def api_add_role(room_name):
@@ -471,14 +794,90 @@ def api_add_role(room_name):
         return jsonify({'error': 'Invalid role count'}), 400
 
     with lock:
-        room['roles'].append({'name': role_name, 'count': count, 'faction': role_faction})
+        _record(room, 'add_role', name=role_name, count=count, faction=role_faction)
 
     return jsonify({'success': True})
 
 
+@app.route('/api/rooms/<room_name>/balance', methods=['POST'])
+def api_balance(room_name):
+    """Host-only: estimate win probabilities for a role setup with a Monte Carlo simulation.
+    Uses the 'roles' form field (JSON list of {name, count, faction}) when given, else the room's saved roles.
+    """
+    room = get_room_or_404(room_name)
+    if not room:
+        return jsonify({'error': 'Room not found or expired'}), 404
+
+    host_token = request.cookies.get('host_token')
+    host_room = request.cookies.get('host_room')
+    if not host_token or host_room != room_name or host_token != room.get('host_token'):
+        return jsonify({'error': 'Unauthorized'}), 403
+
+    roles_json = request.form.get('roles', '').strip()
+    if roles_json:
+        try:
+            setup = json.loads(roles_json)
+        except json.JSONDecodeError:
+            return jsonify({'error': 'Invalid roles'}), 400
+        if not isinstance(setup, list) or not all(isinstance(r, dict) for r in setup):
+            return jsonify({'error': 'Invalid roles'}), 400
+    else:
+        with lock:
+            setup = [dict(r) for r in room.get('roles', [])]
+
+    try:
+        games = int(request.form.get('games', balance.DEFAULT_GAMES))
+        roles_catalog = role_catalog(room)
+        result = balance.simulate(setup, roles_catalog.faction, games=games)
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify({'success': True, 'balance': result})
+
+
+@app.route('/api/rooms/<room_name>/role-pack', methods=['GET', 'POST', 'DELETE'])
+def api_role_pack(room_name):
+    """Custom role pack for a room, layered over the base roles.json catalog.
+    GET returns the pack; POST (host only) replaces it from the 'pack' form field, a JSON object of
+    role name -> {description, faction}; DELETE (host only) removes it.
+    """
+    room = get_room_or_404(room_name)
+    if not room:
+        return jsonify({'error': 'Room not found or expired'}), 404
+
+    if request.method == 'GET':
+        pack = room.get('role_pack')
+        return jsonify({'pack': {name: dict(info) for name, info in pack.roles.items()} if pack else {}})
+
+    host_token = request.cookies.get('host_token')
+    host_room = request.cookies.get('host_room')
+    if not host_token or host_room != room_name or host_token != room.get('host_token'):
+        return jsonify({'error': 'Unauthorized'}), 403
+
+    if request.method == 'DELETE':
+        with lock:
+            _record(room, 'set_role_pack', pack=None)
+        return jsonify({'success': True})
+
+    try:
+        raw = json.loads(request.form.get('pack', '') or '{}')
+        pack = catalog.parse_pack(raw)
+    except json.JSONDecodeError:
+        return jsonify({'error': 'Role pack must be valid JSON'}), 400
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # the reducer swaps in a new pack in a single assignment: readers see either the old pack or the new one
+    with lock:
+        _record(room, 'set_role_pack', pack={name: dict(info) for name, info in pack.roles.items()})
+    return jsonify({'success': True, 'roles_loaded': len(pack)})
+
+
 @app.route('/api/factions', methods=['GET'])
 def api_factions():
-    return jsonify({'factions': factions_map})
+    # ?room=<name> includes that room's custom role pack
+    room = get_room_or_404(request.args.get('room', '')) if request.args.get('room') else None
+    return jsonify({'factions': dict(role_catalog(room).factions)})
 
 @app.route('/api/rooms/<room_name>/roles/<int:index>', methods=['DELETE'])
 def api_remove_role(room_name, index):
@@ -493,14 +892,48 @@ def api_remove_role(room_name, index):
 
     with lock:
         if 0 <= index < len(room['roles']):
-            room['roles'].pop(index)
+            _record(room, 'remove_role', index=index, name=room['roles'][index]['name'])
             return jsonify({'success': True})
 
     return jsonify({'error': 'Invalid role index'}), 400
 
+def _assignment_error(room):
+    """Why roles cannot be assigned in room right now, or None. Caller should hold lock."""
+    total_roles = sum(r['count'] for r in room['roles'])
+    if total_roles != len(room['players']):
+        return f'Total roles ({total_roles}) must equal number of players ({len(room["players"])})'
+    return None
+
+
+def _assign_roles(room):
+    """Shuffle the room's roles onto its players and record the result. Check _assignment_error first.
+    Caller should hold lock."""
+    import random
+    role_list = []
+    for role in room['roles']:
+        role_list.extend([role['name']] * role['count'])
+
+    random.shuffle(role_list)
+    player_names = [p['name'] for p in room['players']]
+
+    assignments = {}
+    for i, player_name in enumerate(player_names):
+        assignments[player_name] = role_list[i]
+
+    # populate assignment_factions mapping per player
+    assignment_factions = {}
+    # build a quick role->faction map from room['roles'] if present
+    role_to_faction = {r['name']: r.get('faction', '') for r in room.get('roles', [])}
+    roles_catalog = role_catalog(room)
+    for player_name, role_assigned in assignments.items():
+        faction = role_to_faction.get(role_assigned) or roles_catalog.faction(role_assigned) or ''
+        assignment_factions[player_name] = faction
+
+    # the shuffled result is recorded, so replaying the log gives the same roles
+    _record(room, 'assign', assignments=assignments, factions=assignment_factions)
+
 @app.route('/api/rooms/<room_name>/assign', methods=['POST'])
 def api_assign_roles(room_name):
-    import random
     room = get_room_or_404(room_name)
     if not room:
         return jsonify({'error': 'Room not found or expired'}), 404
@@ -511,30 +944,10 @@ def api_assign_roles(room_name):
         return jsonify({'error': 'Unauthorized'}), 403
 
     with lock:
-        total_roles = sum(r['count'] for r in room['roles'])
-        if total_roles != len(room['players']):
-            return jsonify({'error': f'Total roles ({total_roles}) must equal number of players ({len(room["players"])})'}), 400
-
-        role_list = []
-        for role in room['roles']:
-            role_list.extend([role['name']] * role['count'])
-
-        random.shuffle(role_list)
-        player_names = [p['name'] for p in room['players']]
-
-        room['assignments'].clear()
-        for i, player_name in enumerate(player_names):
-            room['assignments'][player_name] = role_list[i]
-
-        # populate assignment_factions mapping per player
-        room['assignment_factions'] = {}
-        # build a quick role->faction map from room['roles'] if present
-        role_to_faction = {r['name']: r.get('faction', '') for r in room.get('roles', [])}
-        for player_name, role_assigned in room['assignments'].items():
-            faction = role_to_faction.get(role_assigned) or get_faction_for_role(role_assigned) or ''
-            room['assignment_factions'][player_name] = faction
-
-        room['game_started'] = True
+        err = _assignment_error(room)
+        if err:
+            return jsonify({'error': err}), 400
+        _assign_roles(room)
 
     return jsonify({'success': True})
 
@@ -550,13 +963,10 @@ def api_reset(room_name):
         return jsonify({'error': 'Unauthorized'}), 403
 
     with lock:
-        room['players'].clear()
-        room['roles'].clear()
-        room['assignments'].clear()
-        room['assignment_factions'] = {}
-        room['game_started'] = False
-        room['player_password'] = None
-        room['eliminated_players'] = []  # Add this line
+        _record(room, 'reset')
+        _stop_phases(room)
+        tally = _vote_tally(room)
+    tally.cancel()
 
     return jsonify({'success': True})
 
@@ -577,10 +987,10 @@ def api_restart(room_name):
 
     with lock:
         # Keep players and roles intact; clear assignments and eliminated players and mark not started
-        room['assignments'].clear()
-        room['eliminated_players'] = []
-        room['assignment_factions'] = {}
-        room['game_started'] = False
+        _record(room, 'restart')
+        _stop_phases(room)
+        tally = _vote_tally(room)
+    tally.cancel()
 
     return jsonify({'success': True})
 
@@ -596,12 +1006,86 @@ def api_reset_roles(room_name):
         return jsonify({'error': 'Unauthorized'}), 403
 
     with lock:
-        room['roles'].clear()
-        room['assignments'].clear()
-        room['game_started'] = False
+        _record(room, 'reset_roles')
 
     return jsonify({'success': True})
 
+
+@app.route('/api/rooms/<room_name>/undo', methods=['POST'])
+def api_undo(room_name):
+    """Host-only: undo the most recent host action (kill, kick, assign, restart, reset, role edits...).
+    Later player joins/leaves are kept."""
+    room = get_room_or_404(room_name)
+    if not room:
+        return jsonify({'error': 'Room not found or expired'}), 404
+
+    host_token = request.cookies.get('host_token')
+    host_room = request.cookies.get('host_room')
+    if not host_token or host_room != room_name or host_token != room.get('host_token'):
+        return jsonify({'error': 'Unauthorized'}), 403
+
+    with lock:
+        log = _room_log(room)
+        try:
+            event = log.undo(room)
+        except roomlog.UndoError as e:
+            return jsonify({'error': str(e)}), 400
+        _resync_vote(room)
+        _room_hub(room).state_changed(event.seq)
+        entry = log.history(limit=1)[0]
+
+    print(f"[UNDO] room={room_name} {entry['text']}")
+    return jsonify({'success': True, 'event': entry})
+
+
+@app.route('/api/rooms/<room_name>/redo', methods=['POST'])
+def api_redo(room_name):
+    """Host-only: re-apply the most recently undone host action."""
+    room = get_room_or_404(room_name)
+    if not room:
+        return jsonify({'error': 'Room not found or expired'}), 404
+
+    host_token = request.cookies.get('host_token')
+    host_room = request.cookies.get('host_room')
+    if not host_token or host_room != room_name or host_token != room.get('host_token'):
+        return jsonify({'error': 'Unauthorized'}), 403
+
+    with lock:
+        log = _room_log(room)
+        try:
+            event = log.redo(room)
+        except roomlog.UndoError as e:
+            return jsonify({'error': str(e)}), 400
+        _resync_vote(room)
+        _room_hub(room).state_changed(event.seq)
+        entry = log.history(limit=1)[0]
+
+    return jsonify({'success': True, 'event': entry})
+
+
+@app.route('/api/rooms/<room_name>/history', methods=['GET'])
+def api_history(room_name):
+    """Host-only: the room's game history (newest first) and whether undo/redo are available."""
+    room = get_room_or_404(room_name)
+    if not room:
+        return jsonify({'error': 'Room not found or expired'}), 404
+
+    host_token = request.cookies.get('host_token')
+    host_room = request.cookies.get('host_room')
+    if not host_token or host_room != room_name or host_token != room.get('host_token'):
+        return jsonify({'error': 'Unauthorized'}), 403
+
+    limit = request.args.get('limit', 200, type=int)
+    with lock:
+        log = _room_log(room)
+        data = {
+            'version': log.version,
+            'can_undo': log.can_undo(),
+            'can_redo': log.can_redo(),
+            'events': log.history(limit=max(1, min(limit, 1000))),
+        }
+    return jsonify(data)
+
 # Update the leave function to handle room switching:
 @app.route('/leave', methods=['POST'])
 def leave():
@@ -612,13 +1096,10 @@ def leave():
     if player_name and room_name:
         with lock:
             room = rooms.get(room_name)
-            if room:
-                # Remove player only if device ID matches
-                room['players'][:] = [p for p in room['players'] if not (p['name'] == player_name and p.get('device_id') == player_ip)]
-                room['assignments'].pop(player_name, None)
-                # Remove from eliminated players if present
-                if 'eliminated_players' in room and player_name in room['eliminated_players']:
-                    room['eliminated_players'].remove(player_name)
+            # Remove player only if device ID matches (also drops their assignment and eliminated status)
+            if room and any(p['name'] == player_name and p.get('device_id') == player_ip for p in room['players']):
+                _record(room, 'leave', name=player_name, device_id=player_ip)
+                _vote_tally(room).remove_voter(player_name)
 
     response = make_response(redirect(url_for('home')))
     response.set_cookie('player_name', '', expires=0)
@@ -642,8 +1123,10 @@ def api_debug(room_name):
             'assignments': room['assignments'],
             'game_started': room['game_started'],
             'password_set': room.get('player_password') is not None,
-            'role_descriptions_loaded': len(roles_data),
-            'eliminated_players': room.get('eliminated_players', [])  # Add this line
+            'role_descriptions_loaded': len(role_catalog(room)),
+            'role_catalog_version': catalog.current().version,
+            'eliminated_players': room.get('eliminated_players', []),  # Add this line
+            'memory': memstats.room_bytes(room)
         }
     return jsonify(data)
 
@@ -651,22 +1134,33 @@ def api_debug(room_name):
 @app.route('/api/rooms/<room_name>/chat', methods=['GET', 'POST'])
 def api_room_chat(room_name):
     """Simple in-memory chat for spectators in a room.
-    GET returns recent messages. POST accepts 'message' and adds it with the sender name determined from device cookie.
+    GET returns recent messages. With before=<id>, q=<words>, sender=<name> and/or limit=<n> it pages
+    back through the whole history (including archived messages) instead; next_before is the
+    cursor for the following page.
+    POST accepts 'message' and adds it with the sender name determined from device cookie.
     """
     room = get_room_or_404(room_name)
     if not room:
         return jsonify({'error': 'Room not found or expired'}), 404
 
-    # Ensure chat list exists
-    with lock:
-        if 'chat' not in room:
-            room['chat'] = []
-
     if request.method == 'GET':
-        # return last 200 messages
-        with lock:
-            msgs = room.get('chat', [])[-200:]
-        return jsonify({'messages': msgs})
+        args = request.args
+        if not any(k in args for k in ('before', 'q', 'sender', 'limit')):
+            # return last 200 messages
+            with lock:
+                log = _chat_log(room)
+                msgs = log.to_json_list(log.tail(200))
+            return jsonify({'messages': msgs})
+        try:
+            before = int(args['before']) if args.get('before') else None
+            limit = int(args.get('limit') or 50)
+        except ValueError:
+            return jsonify({'error': 'before and limit must be integers'}), 400
+        limit = max(1, min(limit, 200))
+        query = args.get('q', '').strip()[:200] or None
+        sender = args.get('sender', '').strip() or None
+        msgs, has_more, next_before = _chat_history(room, before, limit, query, sender)
+        return jsonify({'messages': msgs, 'has_more': has_more, 'next_before': next_before})
 
     # POST: add message
     # Identify sender primarily by player_name cookie (if present and valid), otherwise fall back to device mapping
@@ -701,36 +1195,16 @@ def api_room_chat(room_name):
     if len(text) > 800:
         text = text[:800]
 
-    import time
     # Accept optional client_id for deduping optimistic messages from clients
     client_id = request.form.get('client_id')
 
     with lock:
-        # assign unique server id for the message
-        mid = room.get('chat_next_id', 1)
-        room['chat_next_id'] = mid + 1
-
         # assign or ensure a color exists for this sender
-        if 'chat_colors' not in room:
-            room['chat_colors'] = {}
-        if sender not in room['chat_colors']:
-            # Prefer to pop a hue from the room-specific shuffled high-contrast palette
-            hue = None
-            if room.get('chat_palette') and len(room.get('chat_palette')):
-                hue = room['chat_palette'].pop(0)
-            # If palette exhausted or missing, fall back to deterministic hue
-            if hue is None:
-                h = 0
-                for ch in sender:
-                    h = (h * 31 + ord(ch)) % 360
-                hue = h
-            room['chat_colors'][sender] = f'hsl({hue},85%,45%)'
-
-        msg = {'id': mid, 'sender': sender, 'text': text, 'ts': int(time.time()), 'client_id': client_id, 'color': room['chat_colors'][sender]}
-        room.setdefault('chat', []).append(msg)
-        # cap chat history
-        if len(room['chat']) > 1000:
-            room['chat'] = room['chat'][-1000:]
+        color = _assign_chat_color_for_player(room, sender)
+        # the log assigns the server id and caps history
+        log = _chat_log(room)
+        msg = log.to_json(log.append(sender, text, color=color, client_id=client_id))
+        _publish_chat(room, msg)
 
     print(f"[CHAT] room={room_name} sender={sender} id={msg.get('id')} text={text}")
     return jsonify({'success': True, 'message': msg})
@@ -742,38 +1216,63 @@ def api_room_chat_stream(room_name):
     if not room:
         return jsonify({'error': 'Room not found or expired'}), 404
 
+    # a reconnecting EventSource sends the last frame id it saw as Last-Event-ID; that wins over
+    # ?after=<id>, the cursor (e.g. from /bootstrap) the page first connected with and that the
+    # browser keeps in the URL on every reconnect
+    after = request.headers.get('Last-Event-ID', type=int)
+    if after is None:
+        after = request.args.get('after', type=int)
+
     def event_stream():
-        import time, json
-        last_index = 0
+        import queue
+        # frames are encoded once per message by the room's feed and shared by every stream
         with lock:
-            msgs = room.get('chat', [])
-            # send full backlog on connect (bounded)
-            backlog = msgs[-200:]
-        if backlog:
-            yield 'data: ' + json.dumps({'messages': backlog}) + '\n\n'
-            last_index = len(msgs)
-        else:
-            last_index = len(msgs)
-
-        # keep connection open, push new messages as they arrive
-        while True:
-            with lock:
-                msgs = room.get('chat', [])
-                if len(msgs) > last_index:
-                    for m in msgs[last_index:]:
-                        yield 'data: ' + json.dumps({'message': m}) + '\n\n'
-                    last_index = len(msgs)
-            # heartbeat to keep the connection alive
-            yield ': heartbeat\n\n'
-            time.sleep(0.5)
+            feed = _chat_feed(room)
+        sub, backlog = feed.subscribe(after)
+        try:
+            # backlog on connect (bounded, cached until the next message)
+            if backlog:
+                yield backlog
+            while True:
+                if sub.lagging:
+                    # too slow to keep up: skip ahead in one frame, or drop the stream
+                    frame = feed.skip_ahead(sub)
+                    if frame is None:
+                        print(f"[CHAT] room={room_name} dropped a stream that could not keep up")
+                        return
+                    if frame:
+                        yield frame
+                try:
+                    msg_id, frame = sub.queue.get(timeout=15)
+                except queue.Empty:
+                    # heartbeat to keep the connection alive
+                    yield b': heartbeat\n\n'
+                    continue
+                if msg_id <= sub.last_id:
+                    continue  # already sent as part of a backlog frame
+                sub.last_id = msg_id
+                yield frame
+        finally:
+            feed.unsubscribe(sub)
 
     return Response(event_stream(), mimetype='text/event-stream')
 
 # Add endpoint to reload role descriptions
 @app.route("/api/reload-descriptions", methods=["POST"])
 def api_reload_descriptions():
-    load_roles_data()
-    return jsonify({"success": True, "descriptions_loaded": len(roles_data)})
+    """Ask the roles watcher to reload roles.json now. Requires ADMIN_TOKEN (header X-Admin-Token
+    or form field 'token'); disabled when ADMIN_TOKEN is not configured. The reload itself runs on
+    the watcher thread, so this returns immediately.
+    """
+    import hmac
+    admin_token = os.environ.get('ADMIN_TOKEN', '')
+    supplied = request.headers.get('X-Admin-Token') or request.form.get('token', '')
+    if not admin_token or not hmac.compare_digest(supplied.encode('utf-8'), admin_token.encode('utf-8')):
+        return jsonify({'error': 'Unauthorized'}), 403
+
+    catalog.request_reload()
+    current = catalog.current()
+    return jsonify({"success": True, "descriptions_loaded": len(current), "version": current.version}), 202
 
 # Add endpoint to kill a player
 @app.route('/api/rooms/<room_name>/kill-player', methods=['POST'])
@@ -794,25 +1293,12 @@ def api_kill_player(room_name):
         return jsonify({'error': 'Player name is required'}), 400
 
     with lock:
-        # Check if game has started
-        if not room.get('game_started', False):
-            return jsonify({'error': 'Game has not started yet'}), 400
-        
-        # Check if player exists in the room
-        player_exists = any(p['name'] == player_name for p in room['players'])
-        if not player_exists:
-            return jsonify({'error': 'Player not found in room'}), 404
-        
-        # Initialize eliminated_players list if it doesn't exist
-        if 'eliminated_players' not in room:
-            room['eliminated_players'] = []
-        
-        # Check if player is already eliminated
-        if player_name in room['eliminated_players']:
-            return jsonify({'error': 'Player is already eliminated'}), 400
-        
-        # Add player to eliminated list
-        room['eliminated_players'].append(player_name)
+        err = _eliminate_player(room, player_name)
+        if err:
+            return jsonify({'error': err[0]}), err[1]
+        tally = _vote_tally(room)
+    # an eliminated player can no longer vote or be voted for
+    tally.remove_voter(player_name)
 
     return jsonify({'success': True, 'message': f'{player_name} has been eliminated'})
 
@@ -836,67 +1322,224 @@ def api_kick_player(room_name):
         return jsonify({'error': 'Player name is required'}), 400
 
     with lock:
-        # ensure players list exists
-        if 'players' not in room:
-            room['players'] = []
-
-        # find and remove the player entry(s)
-        before = len(room['players'])
-        room['players'][:] = [p for p in room['players'] if p['name'] != player_name]
-        after = len(room['players'])
-
-        if before == after:
+        if not any(p['name'] == player_name for p in room.get('players', [])):
             return jsonify({'error': 'Player not found in room'}), 404
 
-        # Remove assignments, eliminated status and any per-player state
-        room['assignments'].pop(player_name, None)
-        if 'eliminated_players' in room and player_name in room['eliminated_players']:
-            room['eliminated_players'].remove(player_name)
-        # Optionally free up chat color mapping for that player so a new player can get it
-        if 'chat_colors' in room and player_name in room['chat_colors']:
-            room['chat_colors'].pop(player_name, None)
+        # Remove the player entry(s), assignments and eliminated status
+        _record(room, 'kick', name=player_name)
+        # the player's chat color stays in the chat log so their old messages keep it
+        _vote_tally(room).remove_voter(player_name)
 
         # Notify via chat stream so connected clients can react (e.g., kicked client clears cookies)
         try:
-            import time
-            if 'chat' not in room:
-                room['chat'] = []
-            mid = room.get('chat_next_id', 1)
-            room['chat_next_id'] = mid + 1
-            kick_msg = {
-                'id': mid,
-                'sender': 'SYSTEM',
-                'text': f'Player {player_name} was kicked by host',
-                'ts': int(time.time()),
-                'type': 'kick',
-                'target': player_name,
-                'color': 'hsl(0,0%,50%)'
-            }
-            room.setdefault('chat', []).append(kick_msg)
-            if len(room['chat']) > 1000:
-                room['chat'] = room['chat'][-1000:]
+            log = _chat_log(room)
+            kick_msg = log.append(chat.SYSTEM_SENDER, f'Player {player_name} was kicked by host',
+                                  kind='kick', target=player_name)
+            _publish_chat(room, log.to_json(kick_msg))
         except Exception:
             # non-fatal if notification fails
             pass
     print(f"[KICK] room={room_name} kicked={player_name}")
     return jsonify({'success': True, 'message': f'{player_name} has been kicked from the room'})
 
-@app.route('/static/<filename>')
+@app.route('/api/rooms/<room_name>/vote/start', methods=['POST'])
+def api_vote_start(room_name):
+    """Host-only: open a day vote. Every living assigned player may vote and be voted for."""
+    room = get_room_or_404(room_name)
+    if not room:
+        return jsonify({'error': 'Room not found or expired'}), 404
+
+    host_token = request.cookies.get('host_token')
+    host_room = request.cookies.get('host_room')
+    if not host_token or host_room != room_name or host_token != room.get('host_token'):
+        return jsonify({'error': 'Unauthorized'}), 403
+
+    with lock:
+        if not room.get('game_started', False):
+            return jsonify({'error': 'Game has not started yet'}), 400
+        alive = _alive_players(room)
+        tally = _vote_tally(room)
+
+    if len(alive) < 2:
+        return jsonify({'error': 'Not enough living players to vote'}), 400
+
+    tally.start(alive, alive)
+    return jsonify({'success': True, 'vote': tally.snapshot()})
+
+
+@app.route('/api/rooms/<room_name>/vote/close', methods=['POST'])
+def api_vote_close(room_name):
+    """Host-only: close the day vote. With eliminate=1 the sole leader is eliminated
+    through the same path as /kill-player.
+    """
+    room = get_room_or_404(room_name)
+    if not room:
+        return jsonify({'error': 'Room not found or expired'}), 404
+
+    host_token = request.cookies.get('host_token')
+    host_room = request.cookies.get('host_room')
+    if not host_token or host_room != room_name or host_token != room.get('host_token'):
+        return jsonify({'error': 'Unauthorized'}), 403
+
+    tally = _vote_tally(room)
+    try:
+        result = tally.close()
+    except voting.VoteError as e:
+        return jsonify({'error': str(e)}), 400
+
+    eliminated = None
+    if request.form.get('eliminate') == '1' and result['winner']:
+        with lock:
+            err = _eliminate_player(room, result['winner'], via='vote')
+        if err:
+            return jsonify({'error': err[0], 'vote': result}), err[1]
+        eliminated = result['winner']
+        print(f"[VOTE] room={room_name} eliminated={eliminated}")
+
+    return jsonify({'success': True, 'vote': result, 'eliminated': eliminated})
+
+
+@app.route('/api/rooms/<room_name>/vote', methods=['POST'])
+def api_vote(room_name):
+    """Cast or change the requesting player's vote. An empty target retracts it."""
+    room = get_room_or_404(room_name)
+    if not room:
+        return jsonify({'error': 'Room not found or expired'}), 404
+
+    with lock:
+        voter = _session_player(room)
+    if not voter:
+        return jsonify({'error': 'Unauthorized - must be a player in the room to vote'}), 403
+
+    target = request.form.get('target', '').strip() or None
+    # The rooms lock is only held briefly above to look up the room and the voter; the vote
+    # itself is counted under the room's own tally lock.
+    tally = _vote_tally(room)
+    try:
+        delta = tally.cast(voter, target)
+    except voting.VoteError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify({'success': True, 'delta': delta})
+
+
+@app.route('/api/rooms/<room_name>/votes', methods=['GET'])
+def api_votes(room_name):
+    room = get_room_or_404(room_name)
+    if not room:
+        return jsonify({'error': 'Room not found or expired'}), 404
+
+    return jsonify(_vote_tally(room).snapshot())
+
+
+@app.route('/api/rooms/<room_name>/votes/stream')
+def api_votes_stream(room_name):
+    """SSE stream of vote changes: one snapshot on connect, then small deltas."""
+    room = get_room_or_404(room_name)
+    if not room:
+        return jsonify({'error': 'Room not found or expired'}), 404
+
+    tally = _vote_tally(room)
+
+    def event_stream():
+        import queue
+        sub, snap = tally.subscribe()
+        try:
+            yield 'data: ' + json.dumps(dict(snap, type='snapshot')) + '\n\n'
+            while True:
+                if sub.overflowed:
+                    snap = tally.resync(sub)
+                    yield 'data: ' + json.dumps(dict(snap, type='snapshot')) + '\n\n'
+                try:
+                    event = sub.queue.get(timeout=15)
+                except queue.Empty:
+                    # heartbeat to keep the connection alive
+                    yield ': heartbeat\n\n'
+                    continue
+                yield 'data: ' + json.dumps(event) + '\n\n'
+        finally:
+            tally.unsubscribe(sub)
+
+    return Response(event_stream(), mimetype='text/event-stream')
+
+@app.route('/api/rooms/<room_name>/phase', methods=['GET'])
+def api_phase(room_name):
+    """The room's round clock. server_time lets clients correct for clock skew."""
+    import time
+    room = get_room_or_404(room_name)
+    if not room:
+        return jsonify({'error': 'Room not found or expired'}), 404
+
+    with lock:
+        clock = room.get('phase')
+        snap = clock.snapshot() if clock is not None else None
+    return jsonify({'phase': snap, 'server_time': time.time()})
+
+
+@app.route('/api/rooms/<room_name>/phase/<action>', methods=['POST'])
+def api_phase_action(room_name, action):
+    """Host-only: drive the room's round clock (night -> day -> vote -> night ...).
+    Actions: start (optional 'night'/'day'/'vote' seconds), next (end the current phase now),
+    pause, resume, extend ('seconds', default 30) and stop (back to the lobby).
+    The day vote opens and closes with the vote phase; see _enter_phase.
+    """
+    room = get_room_or_404(room_name)
+    if not room:
+        return jsonify({'error': 'Room not found or expired'}), 404
+
+    host_token = request.cookies.get('host_token')
+    host_room = request.cookies.get('host_room')
+    if not host_token or host_room != room_name or host_token != room.get('host_token'):
+        return jsonify({'error': 'Unauthorized'}), 403
+
+    with lock:
+        clock = _phase_clock(room_name, room)
+        try:
+            if action == 'start':
+                if not room.get('game_started', False):
+                    return jsonify({'error': 'Game has not started yet'}), 400
+                durations = {}
+                for phase in phases.NEXT_PHASE:
+                    seconds = request.form.get(phase, '').strip()
+                    if seconds:
+                        try:
+                            durations[phase] = int(seconds)
+                        except ValueError:
+                            return jsonify({'error': f'Invalid {phase} duration'}), 400
+                clock.start(durations)
+                snap = _publish_phase(room)
+            elif action == 'next':
+                snap = _enter_phase(room, clock.next_phase())
+            elif action == 'pause':
+                clock.pause()
+                snap = _publish_phase(room)
+            elif action == 'resume':
+                clock.resume()
+                snap = _publish_phase(room)
+            elif action == 'extend':
+                clock.extend(request.form.get('seconds', 30, type=int))
+                snap = _publish_phase(room)
+            elif action == 'stop':
+                snap = _stop_phases(room) or _publish_phase(room)
+            else:
+                return jsonify({'error': 'Unknown phase action'}), 404
+        except phases.PhaseError as e:
+            return jsonify({'error': str(e)}), 400
+
+    print(f"[PHASE] room={room_name} action={action} phase={snap['phase']} round={snap['round']}")
+    return jsonify({'success': True, 'phase': snap})
+
+@app.route('/static/<path:filename>', endpoint='static')
 def static_files(filename):
-    return send_from_directory('static', filename)
+    return assets.send_static(filename)
 
 
 @app.route('/role_descriptions.json', methods=['GET'])
 def serve_role_descriptions():
-    # For frontend compatibility return a mapping of roleName -> description
-    flat = {}
-    for name, info in roles_data.items():
-        if isinstance(info, dict):
-            flat[name] = info.get('description', '')
-        else:
-            # fallback: if roles_data stored as description string
-            flat[name] = str(info)
-    return jsonify(flat)
+    # For frontend compatibility return a mapping of roleName -> description.
+    # ?room=<name> includes that room's custom role pack.
+    room = get_room_or_404(request.args.get('room', '')) if request.args.get('room') else None
+    return jsonify(role_catalog(room).descriptions())
 
 
 @app.route('/watch/<room_name>', methods=['GET'])
@@ -923,6 +1566,437 @@ def watch_room(room_name):
         return redirect(url_for('home'))
 
     return make_response_with_device_cookie('eliminated.html', name=player_name, room_name=room_name, player_ip=player_ip)
+
+
+# ----------------- Events (multi-table) -----------------
+# An event groups several rooms ("tables") under one organizer, who can move players between
+# tables, assign roles at every table at once and watch all tables from one dashboard.
+# Tables created from the dashboard use the event password as their host password.
+def get_event_or_404(event_name):
+    import time
+    with lock:
+        night = events.get(event_name)
+        if not night:
+            return None
+        if time.time() - night.created_at > ROOM_TTL:
+            # destroy the event; its tables stay as ordinary rooms
+            events.pop(event_name, None)
+            for table in night.tables:
+                room = rooms.get(table)
+                if room is not None and room.get('event') == event_name:
+                    room.pop('event', None)
+            night.detach_all()
+            return None
+        return night
+
+
+def _table_summary(room_name):
+    """Dashboard summary of one table, or None when the room is gone. Caller should hold lock."""
+    room = rooms.get(room_name)
+    if room is None or _room_expired(room):
+        return None
+    players = [p['name'] for p in room['players']]
+    eliminated = room.get('eliminated_players', [])
+    roles_total = sum(r['count'] for r in room['roles'])
+    game_started = room.get('game_started', False)
+    if game_started:
+        alive = sum(1 for name in room.get('assignments', {}) if name not in eliminated)
+    else:
+        alive = len(players)
+    return {
+        'name': room_name,
+        'version': _room_hub(room).state_version,
+        'players': players,
+        'count': len(players),
+        'alive': alive,
+        'eliminated': len(eliminated),
+        'roles_total': roles_total,
+        'ready': not game_started and bool(players) and roles_total == len(players),
+        'game_started': game_started,
+        'vote_open': _vote_tally(room).open,
+        'password_set': room.get('player_password') is not None,
+        'phase': room['phase'].snapshot() if room.get('phase') is not None else None,
+    }
+
+
+def _event_table_for_device(room, player_name, device_id):
+    """The table of room's event that player_name (on device_id) was moved to, or None.
+    Caller should hold lock."""
+    night = events.get(room.get('event'))
+    if night is None:
+        return None
+    for table in night.tables:
+        other = rooms.get(table)
+        if other is not None and any(p['name'] == player_name and p.get('device_id') == device_id
+                                     for p in other['players']):
+            return table
+    return None
+
+
+@app.route('/create_event', methods=['GET', 'POST'])
+def create_event():
+    # Organizer creates an event with an organizer password
+    if request.method == 'GET':
+        return render_template('create_event.html')
+
+    event_name = request.form.get('event_name', '').strip()
+    password = request.form.get('password', '').strip()
+
+    if not event_name:
+        return render_template('create_event.html', error='Event name is required')
+
+    with lock:
+        if event_name in events:
+            return render_template('create_event.html', error='Event already exists')
+
+        import time, secrets
+        token = secrets.token_urlsafe(16)
+        events[event_name] = gamenight.GameNight(event_name, password, token, time.time())
+
+    resp = make_response(redirect(url_for('event_dashboard', event_name=event_name)))
+    resp.set_cookie('event_token', token, max_age=COOKIE_TTL)
+    resp.set_cookie('event_name', event_name, max_age=COOKIE_TTL)
+    return resp
+
+
+@app.route('/event_login', methods=['GET', 'POST'])
+def event_login():
+    if request.method == 'GET':
+        return render_template('create_event.html', login=True)
+
+    event_name = request.form.get('event_name', '').strip()
+    password = request.form.get('password', '').strip()
+
+    night = get_event_or_404(event_name)
+    if not night:
+        return render_template('create_event.html', login=True, error='Event not found or expired')
+    if night.password != password:
+        return render_template('create_event.html', login=True, error='Incorrect password')
+
+    resp = make_response(redirect(url_for('event_dashboard', event_name=event_name)))
+    resp.set_cookie('event_token', night.token, max_age=COOKIE_TTL)
+    resp.set_cookie('event_name', event_name, max_age=COOKIE_TTL)
+    return resp
+
+
+@app.route('/event/<event_name>', methods=['GET'])
+def event_dashboard(event_name):
+    night = get_event_or_404(event_name)
+    if not night:
+        return 'Event not found or expired', 404
+
+    event_token = request.cookies.get('event_token')
+    event_cookie = request.cookies.get('event_name')
+    if not event_token or event_cookie != event_name or event_token != night.token:
+        return redirect(url_for('event_login'))
+
+    return render_template('event.html', event_name=event_name)
+
+
+@app.route('/event/<event_name>/host/<room_name>', methods=['GET'])
+def event_host_table(event_name, room_name):
+    """Organizer-only: open a table's host dashboard (issues that room's host cookie)."""
+    night = get_event_or_404(event_name)
+    if not night:
+        return 'Event not found or expired', 404
+
+    event_token = request.cookies.get('event_token')
+    event_cookie = request.cookies.get('event_name')
+    if not event_token or event_cookie != event_name or event_token != night.token:
+        return redirect(url_for('event_login'))
+
+    room = get_room_or_404(room_name)
+    if not room or room_name not in night.tables:
+        return 'Table not found or expired', 404
+
+    resp = make_response(redirect(url_for('host_dashboard', room_name=room_name)))
+    resp.set_cookie('host_token', room['host_token'], max_age=COOKIE_TTL)
+    resp.set_cookie('host_room', room_name, max_age=COOKIE_TTL)
+    return resp
+
+
+@app.route('/api/events/<event_name>', methods=['GET'])
+def api_event_status(event_name):
+    """Organizer-only: every table's summary. Only tables whose room changed since the last call
+    are re-summarized; ?since=<version> returns just the tables changed (and removed) after it.
+    The full status carries an ETag, so an unchanged event answers 304.
+    """
+    night = get_event_or_404(event_name)
+    if not night:
+        return jsonify({'error': 'Event not found or expired'}), 404
+
+    event_token = request.cookies.get('event_token')
+    event_cookie = request.cookies.get('event_name')
+    if not event_token or event_cookie != event_name or event_token != night.token:
+        return jsonify({'error': 'Unauthorized'}), 403
+
+    since = request.args.get('since', type=int)
+    with lock:
+        night.refresh(_table_summary)
+
+    if since is not None:
+        return jsonify(night.status(since=since))
+
+    version, body = night.status_json()
+    etag = f'event-{version}'
+    if request.if_none_match.contains(etag):
+        resp = make_response('', 304)
+    else:
+        resp = Response(body, mimetype='application/json')
+    resp.set_etag(etag)
+    resp.cache_control.private = True
+    resp.cache_control.no_cache = True
+    return resp
+
+
+@app.route('/api/events/<event_name>/stream')
+def api_event_stream(event_name):
+    """Organizer-only SSE stream: the full status on connect, then only the tables that changed."""
+    night = get_event_or_404(event_name)
+    if not night:
+        return jsonify({'error': 'Event not found or expired'}), 404
+
+    event_token = request.cookies.get('event_token')
+    event_cookie = request.cookies.get('event_name')
+    if not event_token or event_cookie != event_name or event_token != night.token:
+        return jsonify({'error': 'Unauthorized'}), 403
+
+    def event_stream():
+        with lock:
+            night.refresh(_table_summary)
+        import time
+        seen, body = night.status_json()
+        yield b'data: ' + body + b'\n\n'
+        # get_event_or_404 also expires the event, which ends every stream on it
+        while get_event_or_404(event_name) is night:
+            time_left = night.created_at + ROOM_TTL - time.time()
+            if not night.wait(seen, timeout=max(0.1, min(15, time_left))):
+                # heartbeat to keep the connection alive
+                yield b': heartbeat\n\n'
+                continue
+            with lock:
+                version = night.refresh(_table_summary)
+            if version == seen:
+                continue
+            delta = night.status(since=seen)
+            seen = delta['version']
+            yield b'data: ' + json.dumps(delta).encode() + b'\n\n'
+
+    return Response(event_stream(), mimetype='text/event-stream')
+
+
+@app.route('/api/events/<event_name>/tables', methods=['POST'])
+def api_event_add_table(event_name):
+    """Organizer-only: add a table. A new room name creates the room (host password = event
+    password); an existing room needs its host password."""
+    night = get_event_or_404(event_name)
+    if not night:
+        return jsonify({'error': 'Event not found or expired'}), 404
+
+    event_token = request.cookies.get('event_token')
+    event_cookie = request.cookies.get('event_name')
+    if not event_token or event_cookie != event_name or event_token != night.token:
+        return jsonify({'error': 'Unauthorized'}), 403
+
+    room_name = request.form.get('room_name', '').strip()
+    host_password = request.form.get('host_password', '').strip()
+    if not room_name:
+        return jsonify({'error': 'Room name is required'}), 400
+
+    room = get_room_or_404(room_name)
+    with lock:
+        created = False
+        if room is None:
+            if room_name in rooms:
+                return jsonify({'error': 'Room already exists'}), 400
+            import time, secrets
+            room = rooms[room_name] = _new_room(room_name, night.password, secrets.token_urlsafe(16), time.time())
+            created = True
+        elif room.get('event') == event_name:
+            return jsonify({'error': 'Room is already a table of this event'}), 400
+        elif room.get('event'):
+            return jsonify({'error': 'Room belongs to another event'}), 400
+        elif room.get('host_password') != host_password:
+            return jsonify({'error': 'Incorrect host password'}), 403
+
+        room['event'] = event_name
+        night.add_table(room_name, _room_hub(room), _vote_tally(room))
+
+    print(f"[EVENT] event={event_name} table={room_name} created={created}")
+    return jsonify({'success': True, 'created': created})
+
+
+@app.route('/api/events/<event_name>/tables/<room_name>', methods=['DELETE'])
+def api_event_remove_table(event_name, room_name):
+    """Organizer-only: detach a table from the event. The room itself is kept."""
+    night = get_event_or_404(event_name)
+    if not night:
+        return jsonify({'error': 'Event not found or expired'}), 404
+
+    event_token = request.cookies.get('event_token')
+    event_cookie = request.cookies.get('event_name')
+    if not event_token or event_cookie != event_name or event_token != night.token:
+        return jsonify({'error': 'Unauthorized'}), 403
+
+    with lock:
+        if room_name not in night.tables:
+            return jsonify({'error': 'Table not found'}), 404
+        room = rooms.get(room_name)
+        if room is not None:
+            room.pop('event', None)
+        night.remove_table(room_name)
+
+    return jsonify({'success': True})
+
+
+@app.route('/api/events/<event_name>/move', methods=['POST'])
+def api_event_move_player(event_name):
+    """Organizer-only: move a player (and their device) from one table to another. Neither table
+    may have a game in progress for them; the player's page follows them to the new table."""
+    night = get_event_or_404(event_name)
+    if not night:
+        return jsonify({'error': 'Event not found or expired'}), 404
+
+    event_token = request.cookies.get('event_token')
+    event_cookie = request.cookies.get('event_name')
+    if not event_token or event_cookie != event_name or event_token != night.token:
+        return jsonify({'error': 'Unauthorized'}), 403
+
+    player_name = request.form.get('player_name', '').strip()
+    from_table = request.form.get('from_table', '').strip()
+    to_table = request.form.get('to_table', '').strip()
+    if not player_name:
+        return jsonify({'error': 'Player name is required'}), 400
+    if from_table == to_table:
+        return jsonify({'error': 'Choose a different table'}), 400
+
+    with lock:
+        if from_table not in night.tables or to_table not in night.tables:
+            return jsonify({'error': 'Both tables must belong to this event'}), 400
+        src = rooms.get(from_table)
+        dst = rooms.get(to_table)
+        if src is None or dst is None:
+            return jsonify({'error': 'Table not found or expired'}), 404
+
+        player = next((p for p in src['players'] if p['name'] == player_name), None)
+        if player is None:
+            return jsonify({'error': 'Player not found in room'}), 404
+        if src.get('game_started') and player_name in src.get('assignments', {}):
+            return jsonify({'error': 'Cannot move a player out of a game in progress'}), 400
+        if dst.get('game_started'):
+            return jsonify({'error': f'Table {to_table} has a game in progress'}), 400
+        if any(p['name'].lower() == player_name.lower() for p in dst['players']):
+            return jsonify({'error': f'Name already taken at table {to_table}'}), 400
+        device_id = player.get('device_id')
+        if device_id and any(p.get('device_id') == device_id for p in dst['players']):
+            return jsonify({'error': f'This device already joined table {to_table}'}), 400
+
+        _record(src, 'leave', name=player_name, device_id=device_id, to=to_table)
+        _vote_tally(src).remove_voter(player_name)
+        _record(dst, 'join', name=player_name, device_id=device_id, source=from_table)
+        _assign_chat_color_for_player(dst, player_name)
+
+        # Tell the player's page (via the old table's chat stream) to follow them
+        log = _chat_log(src)
+        move_msg = log.append(chat.SYSTEM_SENDER, f'{player_name} moved to table {to_table}',
+                              kind='move', target=player_name)
+        _publish_chat(src, log.to_json(move_msg))
+
+    print(f"[EVENT] event={event_name} moved={player_name} {from_table} -> {to_table}")
+    return jsonify({'success': True})
+
+
+@app.route('/api/events/<event_name>/assign', methods=['POST'])
+def api_event_assign(event_name):
+    """Organizer-only: assign roles at every table that has players and no game in progress.
+    All-or-nothing: if any of those tables is not ready, nothing is assigned and 'errors' says why.
+    """
+    night = get_event_or_404(event_name)
+    if not night:
+        return jsonify({'error': 'Event not found or expired'}), 404
+
+    event_token = request.cookies.get('event_token')
+    event_cookie = request.cookies.get('event_name')
+    if not event_token or event_cookie != event_name or event_token != night.token:
+        return jsonify({'error': 'Unauthorized'}), 403
+
+    with lock:
+        waiting = [t for t in night.tables
+                   if rooms.get(t) is not None and rooms[t]['players'] and not rooms[t].get('game_started')]
+        if not waiting:
+            return jsonify({'error': 'No tables are waiting to start'}), 400
+        errors = {}
+        for table in waiting:
+            err = _assignment_error(rooms[table])
+            if err:
+                errors[table] = err
+        if errors:
+            return jsonify({'error': 'Some tables are not ready', 'errors': errors}), 400
+        for table in waiting:
+            _assign_roles(rooms[table])
+
+    print(f"[EVENT] event={event_name} assigned tables={len(waiting)}")
+    return jsonify({'success': True, 'tables': waiting})
+
+
+# ----------------- Persistence -----------------
+def _restore_rooms():
+    """Rebuild unexpired rooms from the journals in ROOM_LOG_DIR (chat and votes start empty)."""
+    import time
+    os.makedirs(ROOM_LOG_DIR, exist_ok=True)
+    for fname in sorted(os.listdir(ROOM_LOG_DIR)):
+        if not fname.endswith('.jsonl'):
+            continue
+        path = os.path.join(ROOM_LOG_DIR, fname)
+        try:
+            header, _ = roomlog.read_journal(path)
+            if time.time() - header['created_at'] > ROOM_TTL:
+                os.remove(path)
+                continue
+            room = _new_room(header['room'], header['host_password'], header['host_token'],
+                             header['created_at'], journal=False)
+            room['log'] = roomlog.RoomLog.restore(room, path)
+        except (OSError, ValueError, KeyError, IndexError) as e:
+            print(f"Warning: could not restore room journal {fname}: {e}")
+            continue
+        for p in room['players']:
+            _assign_chat_color_for_player(room, p['name'])
+        _room_hub(room).state_changed(room['log'].version)
+        rooms[header['room']] = room
+    if rooms:
+        print(f"Restored {len(rooms)} rooms from {ROOM_LOG_DIR}")
+
+
+# Rebuild rooms from their event journals when persistence is enabled
+if ROOM_LOG_DIR:
+    _restore_rooms()
+
+# chat archives left by an earlier run (chat is not restored; a room never outlives ROOM_TTL)
+chatarchive.sweep(CHAT_ARCHIVE_DIR, ROOM_TTL)
+
+
+# ----------------- Live channel -----------------
+def _ws_chat_backlog(room, after=None):
+    with lock:
+        log = _chat_log(room)
+        msgs = log.tail(200) if after is None else log.since(after)[-200:]
+        return log.to_json_list(msgs), log.last_id
+
+
+def _ws_state(room):
+    with lock:
+        return _players_payload(room)
+
+
+# Optional WebSocket endpoint multiplexing chat, state, votes and host commands (needs flask-sock)
+realtime.init_app(app, {
+    'get_room': get_room_or_404,
+    'hub': _room_hub,
+    'vote_tally': _vote_tally,
+    'chat_backlog': _ws_chat_backlog,
+    'state_for': _ws_state,
+})
+
 # ----------------- Startup helpers -----------------
 def find_free_port(preferred=5051):
     import socket
@@ -0,0 +1,111 @@
+"""Memory accounting for rooms.
+
+room_bytes() walks a room's object graph (dicts, lists, deques, arrays,
+__slots__ records such as chat messages) and sums sys.getsizeof over every
+object reached once. Interned strings shared between rooms (sender names,
+dict keys) are counted only within the room that is being measured.
+
+Run `python memstats.py [rooms]` to create idle rooms the way the server
+does and check their RSS growth against IDLE_ROOMS_RSS_TARGET (it exits
+with status 1 when over budget).
+"""
+import os
+import sys
+from collections import deque
+from threading import Lock
+
+# Target resident memory for 1000 idle rooms (created, a few players joined,
+# no chat), measured as the RSS delta after creating them (see measure_idle_rooms).
+# Rooms with full chat history cost more; use room_bytes() to see where.
+IDLE_ROOMS_RSS_TARGET = 8 * 1024 * 1024
+IDLE_ROOM_PLAYERS = 4
+
+# Objects that are shared by every room and should not be charged to one
+_SKIP_TYPES = (type, type(Lock()), type(sys))
+
+
+def deep_sizeof(obj, seen=None):
+    """Approximate bytes used by obj and everything it references."""
+    if seen is None:
+        seen = set()
+    total = 0
+    stack = [obj]
+    while stack:
+        o = stack.pop()
+        if id(o) in seen or isinstance(o, _SKIP_TYPES) or callable(o):
+            continue
+        seen.add(id(o))
+        total += sys.getsizeof(o)
+        if isinstance(o, dict):
+            stack.extend(o.keys())
+            stack.extend(o.values())
+        elif isinstance(o, (list, tuple, set, frozenset, deque)):
+            stack.extend(o)
+        elif isinstance(o, (str, bytes, int, float, bool)) or o is None:
+            continue
+        else:
+            slots = getattr(type(o), '__slots__', ())
+            for name in slots:
+                if hasattr(o, name):
+                    stack.append(getattr(o, name))
+            if hasattr(o, '__dict__'):
+                stack.append(o.__dict__)
+    return total
+
+
+def room_bytes(room):
+    """Approximate bytes held by one room, broken down by top-level key."""
+    seen = set()
+    breakdown = {}
+    for key, value in room.items():
+        breakdown[key] = deep_sizeof(value, seen)
+    return {'total': sys.getsizeof(room) + sum(breakdown.values()), 'by_key': breakdown}
+
+
+def _rss():
+    """Current resident set size in bytes (Linux /proc; 0 where unavailable)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return 0
+
+
+def measure_idle_rooms(n=1000):
+    """Create n idle rooms with IDLE_ROOM_PLAYERS players each through the server's own helpers
+    and return {'rooms', 'rss_bytes', 'room_bytes', 'target'}; target is scaled to n rooms."""
+    import gc
+    import time
+    import mafia  # imported here: mafia imports this module
+
+    gc.collect()
+    before = _rss()
+    made = []
+    with mafia.lock:
+        for i in range(n):
+            name = f'memstats-{i}'
+            room = mafia._new_room(name, 'pw', f'token-{i}', time.time(), journal=False)
+            mafia.rooms[name] = room
+            for j in range(IDLE_ROOM_PLAYERS):
+                player = f'Player {j}'
+                mafia._record(room, 'join', name=player, device_id=f'10.0.{i % 250}.{j}')
+                mafia._assign_chat_color_for_player(room, player)
+            made.append(room)
+    gc.collect()
+    rss = _rss() - before
+    sample = room_bytes(made[-1])['total'] if made else 0
+    with mafia.lock:
+        for room in made:
+            if room['chat'].archive is not None:
+                room['chat'].archive.discard()
+        for i in range(n):
+            mafia.rooms.pop(f'memstats-{i}', None)
+    return {'rooms': n, 'rss_bytes': rss, 'room_bytes': sample,
+            'target': IDLE_ROOMS_RSS_TARGET * n // 1000}
+
+
+if __name__ == '__main__':
+    result = measure_idle_rooms(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
+    print(f"{result['rooms']} idle rooms: RSS +{result['rss_bytes'] / 2**20:.1f} MiB "
+          f"(target {result['target'] / 2**20:.1f} MiB), one room ~{result['room_bytes']} bytes")
+    sys.exit(0 if result['rss_bytes'] <= result['target'] else 1)
@@ -0,0 +1,248 @@
+"""Server-side round clock: lobby -> night -> day -> vote -> night -> ...
+
+A room that runs timed rounds has a PhaseClock holding its phase, the day
+number and an absolute deadline. The deadlines of every room live in one
+Scheduler: a single daemon thread sleeping on a heap of timers until the
+earliest one is due, so thousands of rooms cost one sleeping thread and a
+heap entry each rather than a thread or a poll loop per room, and nothing
+runs while no deadline is near. Pausing, extending or skipping a phase
+cancels the old timer lazily: it stays in the heap marked cancelled and is
+dropped when it reaches the top (or when cancelled entries pile up).
+
+Deadlines are absolute server times (time.time()), so a client that
+reconnects only has to read the clock's snapshot to resume its countdown.
+What happens at a phase change (opening or closing the day vote) is up to
+the on_deadline callback; the clock only keeps time.
+"""
+import heapq
+import itertools
+import os
+import threading
+import time
+
+PHASES = ('lobby', 'night', 'day', 'vote')
+NEXT_PHASE = {'night': 'day', 'day': 'vote', 'vote': 'night'}
+
+# Default phase lengths in seconds; hosts can override them per room
+DEFAULT_DURATIONS = {
+    'night': int(os.environ.get('PHASE_NIGHT_SECONDS', 60)),
+    'day': int(os.environ.get('PHASE_DAY_SECONDS', 180)),
+    'vote': int(os.environ.get('PHASE_VOTE_SECONDS', 60)),
+}
+MIN_DURATION = 5
+MAX_DURATION = 60 * 60
+
+# Rebuild the heap once this many cancelled timers make up more than half of it
+COMPACT_AFTER = 1024
+
+
+class PhaseError(Exception):
+    """Raised for a phase action that does not apply right now (e.g. pausing the lobby)."""
+
+
+class Timer:
+    __slots__ = ('when', 'callback', 'args', 'state')
+
+    # state: 'pending' -> 'done' (popped to run) or 'cancelled'
+    def __init__(self, when, callback, args):
+        self.when = when
+        self.callback = callback
+        self.args = args
+        self.state = 'pending'
+
+
+class Scheduler:
+    """One thread running callbacks at absolute times from a heap. The thread is started by the
+    first call_at(). Callbacks run on it, outside the scheduler's lock, and should be short."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._heap = []  # (when, tie-breaker, Timer)
+        self._counter = itertools.count()
+        self._cancelled = 0
+        self._thread = None
+
+    def __len__(self):
+        with self._cond:
+            return len(self._heap) - self._cancelled
+
+    def call_at(self, when, callback, *args):
+        """Run callback(*args) at time.time() >= when. Returns a Timer for cancel()."""
+        timer = Timer(when, callback, args)
+        with self._cond:
+            heapq.heappush(self._heap, (when, next(self._counter), timer))
+            # only wake the thread if this is now the earliest deadline
+            if self._heap[0][2] is timer:
+                self._cond.notify()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='phase-scheduler', daemon=True)
+                self._thread.start()
+        return timer
+
+    def cancel(self, timer):
+        with self._cond:
+            if timer is None or timer.state != 'pending':
+                return
+            timer.state = 'cancelled'
+            self._cancelled += 1
+            if self._cancelled > COMPACT_AFTER and self._cancelled * 2 > len(self._heap):
+                self._heap = [entry for entry in self._heap if entry[2].state == 'pending']
+                heapq.heapify(self._heap)
+                self._cancelled = 0
+
+    def _next_due_locked(self):
+        """Wait until timers are due; return them (popped and marked done)."""
+        while True:
+            while self._heap and self._heap[0][2].state == 'cancelled':
+                heapq.heappop(self._heap)
+                self._cancelled -= 1
+            if not self._heap:
+                self._cond.wait()
+                continue
+            delay = self._heap[0][0] - time.time()
+            if delay > 0:
+                self._cond.wait(delay)
+                continue
+            due = []
+            now = time.time()
+            while self._heap and self._heap[0][0] <= now:
+                timer = heapq.heappop(self._heap)[2]
+                if timer.state == 'cancelled':
+                    self._cancelled -= 1
+                    continue
+                timer.state = 'done'
+                due.append(timer)
+            return due
+
+    def _run(self):
+        while True:
+            with self._cond:
+                due = self._next_due_locked()
+            # run outside our lock: callbacks take the rooms lock, whose holders call call_at()
+            for timer in due:
+                try:
+                    timer.callback(*timer.args)
+                except Exception as e:
+                    print(f"[PHASE] timer callback failed: {e}")
+
+
+scheduler = Scheduler()
+
+
+class PhaseClock:
+    """Phase, day number and deadline for one room. Callers hold the rooms lock.
+
+    on_deadline(clock) is called on the scheduler thread when the current phase runs out; it
+    should check due() under the rooms lock (the clock may have changed since) and then
+    advance the clock with enter().
+    """
+
+    __slots__ = ('phase', 'round', 'deadline', 'remaining', 'durations', 'version', 'timer',
+                 'on_deadline')
+
+    def __init__(self, on_deadline):
+        self.phase = 'lobby'
+        self.round = 0
+        self.deadline = None    # absolute time the current phase ends; None in the lobby or paused
+        self.remaining = None   # seconds left while paused
+        self.durations = dict(DEFAULT_DURATIONS)
+        self.version = 0
+        self.timer = None
+        self.on_deadline = on_deadline
+
+    @property
+    def running(self):
+        return self.phase != 'lobby'
+
+    @property
+    def paused(self):
+        return self.remaining is not None
+
+    def due(self, now):
+        return self.deadline is not None and self.deadline <= now
+
+    def set_durations(self, durations):
+        """Override phase lengths from {phase: seconds}. Raises PhaseError for bad values."""
+        for phase, seconds in durations.items():
+            if phase not in NEXT_PHASE:
+                raise PhaseError(f'Unknown phase {phase}')
+            if not MIN_DURATION <= seconds <= MAX_DURATION:
+                raise PhaseError(f'{phase.capitalize()} must last {MIN_DURATION}-{MAX_DURATION} seconds')
+        self.durations.update(durations)
+
+    # ----- transitions -----
+    def _schedule(self, deadline):
+        scheduler.cancel(self.timer)
+        self.deadline = deadline
+        self.timer = scheduler.call_at(deadline, self.on_deadline, self) if deadline is not None else None
+
+    def enter(self, phase, now=None):
+        """Switch to phase with a full-length deadline (none in the lobby). Night starts a new day."""
+        now = time.time() if now is None else now
+        if phase == 'lobby':
+            self.round = 0
+        elif phase == 'night':
+            self.round += 1
+        self.phase = phase
+        self.remaining = None
+        self._schedule(now + self.durations[phase] if phase != 'lobby' else None)
+        self.version += 1
+
+    def start(self, durations=None):
+        """Start at night of day 1, first overriding phase lengths from durations (see
+        set_durations). Raises PhaseError, changing nothing, if rounds already run."""
+        if self.running:
+            raise PhaseError('Rounds are already running')
+        if durations:
+            self.set_durations(durations)
+        self.round = 0
+        self.enter('night')
+
+    def next_phase(self):
+        """The phase the current one leads to. Raises PhaseError in the lobby."""
+        if not self.running:
+            raise PhaseError('Rounds are not running')
+        return NEXT_PHASE[self.phase]
+
+    def pause(self):
+        if not self.running or self.paused:
+            raise PhaseError('Nothing to pause')
+        self.remaining = max(0, round(self.deadline - time.time(), 1))
+        self._schedule(None)
+        self.version += 1
+
+    def resume(self):
+        if not self.paused:
+            raise PhaseError('The clock is not paused')
+        deadline = time.time() + self.remaining
+        self.remaining = None
+        self._schedule(deadline)
+        self.version += 1
+
+    def extend(self, seconds):
+        if not self.running:
+            raise PhaseError('Rounds are not running')
+        if not 1 <= seconds <= MAX_DURATION:
+            raise PhaseError(f'Extend by 1-{MAX_DURATION} seconds')
+        if self.paused:
+            self.remaining += seconds
+        else:
+            self._schedule(self.deadline + seconds)
+        self.version += 1
+
+    def stop(self):
+        """Back to the lobby with no deadline (game restarted, reset or room gone)."""
+        if self.running or self.timer is not None:
+            self.enter('lobby')
+
+    # ----- reads -----
+    def snapshot(self):
+        return {
+            'phase': self.phase,
+            'round': self.round,
+            'deadline': self.deadline,
+            'paused': self.paused,
+            'remaining': self.remaining,
+            'durations': dict(self.durations),
+            'version': self.version,
+        }
@@ -0,0 +1,423 @@
+"""Per-room change notifications and the multiplexed WebSocket channel.
+
+RoomHub fans room events (chat messages, state changes, round clock
+changes) out to subscriber queues. The WebSocket endpoint (registered by
+init_app when flask-sock is installed) gives each client a single connection
+that carries chat, room state deltas, vote deltas, phase changes and host
+commands; the SSE streams and polling endpoints stay available as the
+fallback.
+
+Frames are JSON text messages:
+
+  client -> server  {"t": "chat" | "vote" | "cmd" | "ping", "id": <n>, "d": {...}}
+  server -> client  {"t": "ack", "id": <n>, "ok": true/false, "status": <http status>, "d": {...}}
+                    {"t": "hello" | "state" | "chat" | "vote" | "phase" | "snapshot", "seq": <n>, ...}
+
+Every client frame with an "id" is acknowledged with the same id. Server
+events carry a per-connection "seq" so a client can tell it missed one;
+after an overflow the server sends a fresh "snapshot" instead of replaying.
+Commands run through the same view functions as the HTTP API (as an
+internal request carrying the client's cookies), so auth and validation are
+identical on both paths.
+
+ChatFeed is the SSE side of chat: each message is encoded to its frame bytes
+once and the same buffer is queued for every stream, with bounded queues that
+skip ahead (or drop) slow consumers.
+"""
+import json
+import queue
+import threading
+from collections import deque
+from threading import Lock
+from urllib.parse import quote
+
+try:
+    from flask_sock import Sock
+except ImportError:  # flask-sock not installed: clients use the SSE/poll fallback
+    Sock = None
+
+# Buffered events per connection before it is resynced with a snapshot
+CONNECTION_QUEUE_SIZE = 512
+
+# Buffered SSE frames per stream before it is skipped ahead, and how many
+# skips a stream gets before it is dropped (the browser reconnects with Last-Event-ID)
+SSE_QUEUE_SIZE = 256
+SSE_MAX_SKIPS = 3
+# Messages in the cached connect backlog (matches the chat GET endpoint)
+SSE_BACKLOG = 200
+
+# cmd name -> (HTTP method, path under /api/rooms/<room>/)
+COMMANDS = {
+    'kill': ('POST', 'kill-player'),
+    'kick': ('POST', 'kick-player'),
+    'assign': ('POST', 'assign'),
+    'restart': ('POST', 'restart'),
+    'reset': ('POST', 'reset'),
+    'reset_roles': ('POST', 'reset-roles'),
+    'add_role': ('POST', 'roles'),
+    'set_password': ('POST', 'set-player-password'),
+    'vote_start': ('POST', 'vote/start'),
+    'vote_close': ('POST', 'vote/close'),
+    'balance': ('POST', 'balance'),
+    'undo': ('POST', 'undo'),
+    'redo': ('POST', 'redo'),
+    'phase_start': ('POST', 'phase/start'),
+    'phase_next': ('POST', 'phase/next'),
+    'phase_pause': ('POST', 'phase/pause'),
+    'phase_resume': ('POST', 'phase/resume'),
+    'phase_extend': ('POST', 'phase/extend'),
+    'phase_stop': ('POST', 'phase/stop'),
+}
+
+
+class RoomHub:
+    """Fan-out of room events to subscribers. Safe to publish while holding the rooms lock."""
+
+    __slots__ = ('_lock', '_subscribers', 'state_version')
+
+    def __init__(self):
+        self._lock = Lock()
+        self._subscribers = []
+        self.state_version = 0
+
+    def subscribe(self, sub):
+        with self._lock:
+            self._subscribers.append(sub)
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            try:
+                self._subscribers.remove(sub)
+            except ValueError:
+                pass
+
+    def publish(self, channel, payload):
+        with self._lock:
+            subs = list(self._subscribers)
+        for sub in subs:
+            sub.push((channel, payload))
+
+    def state_changed(self, version=None):
+        """Set the room's state version (the room log's event seq; bumped by one when not given)
+        and tell subscribers to refresh their view."""
+        with self._lock:
+            self.state_version = self.state_version + 1 if version is None else version
+            version = self.state_version
+        self.publish('state', version)
+        return version
+
+
+class Connection:
+    """Outgoing event queue for one WebSocket client."""
+
+    def __init__(self):
+        self.queue = queue.Queue(maxsize=CONNECTION_QUEUE_SIZE)
+        self.overflowed = False
+
+    def push(self, item):
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            self.overflowed = True
+
+
+class FrameQueue:
+    """Outgoing (message id, SSE frame bytes) for one stream. Never grows past SSE_QUEUE_SIZE."""
+
+    __slots__ = ('queue', 'lagging', 'last_id', 'skips')
+
+    def __init__(self, last_id=0):
+        self.queue = queue.Queue(maxsize=SSE_QUEUE_SIZE)
+        # set when a frame was dropped; the stream skips ahead from last_id (the last id it sent)
+        self.lagging = False
+        self.last_id = last_id
+        self.skips = 0
+
+    def push(self, item):
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            self.lagging = True
+
+
+def _sse_frame(json_bytes, event_id=None):
+    head = b'id: %d\n' % event_id if event_id is not None else b''
+    return head + b'data: ' + json_bytes + b'\n\n'
+
+
+class ChatFeed:
+    """Encode-once SSE fan-out of a room's chat.
+
+    Each message is serialized once when published; every subscriber queue gets
+    the same frame bytes. The recent messages are kept as encoded JSON so the
+    connect-time backlog frame is spliced together without re-encoding, cached,
+    and rebuilt only after the next append. Frames carry `id:` so a reconnecting
+    EventSource resumes via Last-Event-ID.
+    """
+
+    __slots__ = ('_lock', '_subscribers', '_recent', '_backlog_frame')
+
+    def __init__(self, messages=(), backlog=SSE_BACKLOG):
+        self._lock = Lock()
+        self._subscribers = []
+        # (id, JSON bytes of the message dict), oldest first
+        self._recent = deque(((m['id'], json.dumps(m).encode()) for m in messages), maxlen=backlog)
+        self._backlog_frame = None
+
+    def publish(self, message):
+        """Encode message once and queue the frame for every subscriber."""
+        encoded = json.dumps(message).encode()
+        frame = _sse_frame(b'{"message": ' + encoded + b'}', message['id'])
+        with self._lock:
+            self._recent.append((message['id'], encoded))
+            self._backlog_frame = None
+            subs = list(self._subscribers)
+        item = (message['id'], frame)
+        for sub in subs:
+            sub.push(item)
+
+    def _backlog_locked(self, after=None):
+        if after is None:
+            if self._backlog_frame is None:
+                if not self._recent:
+                    return b''
+                self._backlog_frame = _sse_frame(
+                    b'{"messages": [' + b', '.join(enc for _, enc in self._recent) + b']}',
+                    self._recent[-1][0])
+            return self._backlog_frame
+        newer = [(i, enc) for i, enc in self._recent if i > after]
+        if not newer:
+            return b''
+        return _sse_frame(b'{"messages": [' + b', '.join(enc for _, enc in newer) + b']}', newer[-1][0])
+
+    def subscribe(self, after=None):
+        """Register a stream. Returns (FrameQueue, backlog frame bytes) taken atomically;
+        after limits the backlog to messages newer than that id."""
+        with self._lock:
+            frame = self._backlog_locked(after)
+            sub = FrameQueue(self._recent[-1][0] if self._recent else (after or 0))
+            self._subscribers.append(sub)
+            return sub, frame
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            try:
+                self._subscribers.remove(sub)
+            except ValueError:
+                pass
+
+    def skip_ahead(self, sub):
+        """Drop a lagging stream's queue and return one frame with what it missed since its
+        last delivered id (the cached backlog if it fell out of the window), or None once it
+        has lagged SSE_MAX_SKIPS times and should be disconnected."""
+        with self._lock:
+            while True:
+                try:
+                    sub.queue.get_nowait()
+                except queue.Empty:
+                    break
+            sub.lagging = False
+            sub.skips += 1
+            if sub.skips > SSE_MAX_SKIPS:
+                if sub in self._subscribers:
+                    self._subscribers.remove(sub)
+                return None
+            # everything after last_id is still in the window, or the client has a gap anyway
+            in_window = bool(self._recent) and self._recent[0][0] <= sub.last_id + 1
+            frame = self._backlog_locked(sub.last_id if in_window else None)
+            if self._recent:
+                sub.last_id = self._recent[-1][0]
+            return frame
+
+
+class _VoteFeed:
+    """Adapter so a VoteTally can publish into a Connection tagged as 'vote'."""
+
+    __slots__ = ('conn',)
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def push(self, event):
+        self.conn.push(('vote', event))
+
+
+def _diff(old, new):
+    return {k: v for k, v in new.items() if old.get(k) != v}
+
+
+def _frame_request(kind, data):
+    """Map a client frame to run_request() arguments (method, subpath, form), or to a
+    (status, body) reply when the frame needs no request or is malformed."""
+    if not isinstance(data, dict):
+        return 400, {'error': 'Malformed frame'}
+    if kind == 'ping':
+        return 200, {'pong': True}
+    if kind == 'chat':
+        form = {'message': str(data.get('message', ''))}
+        if data.get('client_id'):
+            form['client_id'] = str(data['client_id'])
+        return 'POST', 'chat', form
+    if kind == 'vote':
+        return 'POST', 'vote', {'target': str(data.get('target') or '')}
+    if kind == 'cmd':
+        name = data.get('name')
+        if not isinstance(name, str) or name not in COMMANDS:
+            return 400, {'error': 'Unknown command'}
+        args = data.get('args') or {}
+        if not isinstance(args, dict):
+            return 400, {'error': 'Malformed frame'}
+        method, subpath = COMMANDS[name]
+        return method, subpath, {str(k): str(v) for k, v in args.items()}
+    return 400, {'error': 'Unknown frame type'}
+
+
+def init_app(app, hooks):
+    """Register the WebSocket endpoint if flask-sock is available. Returns True if registered.
+
+    hooks supplies the app-specific pieces:
+      get_room(name) -> room or None
+      hub(room) -> RoomHub
+      vote_tally(room) -> VoteTally
+      chat_backlog(room, after=None) -> (messages as JSON dicts, last message id); after limits
+        the backlog to messages newer than a resume cursor
+      state_for(room) -> dict (the /players payload for the viewer of the current request context)
+    """
+    if Sock is None:
+        return False
+    sock = Sock(app)
+
+    @sock.route('/api/rooms/<room_name>/ws')
+    def room_socket(ws, room_name):
+        from flask import request
+        room = hooks['get_room'](room_name)
+        if not room:
+            ws.close(reason=1008, message='Room not found or expired')
+            return
+
+        # what the handshake carried, so commands authenticate exactly like HTTP requests
+        cookie_header = request.headers.get('Cookie', '')
+        headers = {k: v for k, v in request.headers.items()
+                   if k in ('User-Agent', 'Accept-Language', 'Accept-Encoding', 'Accept', 'X-Forwarded-For')}
+        remote_addr = request.remote_addr
+        # ?after=<chat id> (the /bootstrap cursor) skips chat the client already has
+        resume_after = request.args.get('after', type=int)
+
+        conn = Connection()
+        vote_feed = _VoteFeed(conn)
+        hub = hooks['hub'](room)
+        tally = hooks['vote_tally'](room)
+        hub.subscribe(conn)
+        _, vote_snap = tally.subscribe(vote_feed)
+        closed = threading.Event()
+        # acks go out from the receive loop and events from the sender thread
+        send_lock = Lock()
+
+        def send_raw(frame):
+            with send_lock:
+                ws.send(json.dumps(frame))
+
+        # the room name goes back into a URL path, so quote it ('what?', 'a#b', 'x/y')
+        room_path = f"/api/rooms/{quote(room_name, safe='')}"
+
+        def run_request(method, subpath, form):
+            path = f'{room_path}/{subpath}'
+            with app.test_request_context(path, method=method, data=form or {},
+                                          headers=dict(headers, Cookie=cookie_header),
+                                          environ_base={'REMOTE_ADDR': remote_addr}):
+                resp = app.full_dispatch_request()
+            try:
+                body = json.loads(resp.get_data(as_text=True) or 'null')
+            except ValueError:
+                body = None
+            return resp.status_code, body
+
+        def state_view():
+            with app.test_request_context(f'{room_path}/players',
+                                          headers=dict(headers, Cookie=cookie_header),
+                                          environ_base={'REMOTE_ADDR': remote_addr}):
+                return hooks['state_for'](room)
+
+        def sender():
+            seq = 0
+            last_state = {}
+
+            def send(frame):
+                nonlocal seq
+                seq += 1
+                frame['seq'] = seq
+                send_raw(frame)
+
+            try:
+                backlog, _ = hooks['chat_backlog'](room, resume_after)
+                last_state = state_view()
+                send({'t': 'hello', 'room': room_name, 'state_version': hub.state_version,
+                      'state': last_state, 'chat': backlog, 'vote': vote_snap})
+                while not closed.is_set():
+                    if conn.overflowed:
+                        # drop what is queued and start over from a snapshot
+                        while True:
+                            try:
+                                conn.queue.get_nowait()
+                            except queue.Empty:
+                                break
+                        conn.overflowed = False
+                        backlog, _ = hooks['chat_backlog'](room)
+                        last_state = state_view()
+                        send({'t': 'snapshot', 'state_version': hub.state_version, 'state': last_state,
+                              'chat': backlog, 'vote': tally.snapshot()})
+                    try:
+                        channel, payload = conn.queue.get(timeout=15)
+                    except queue.Empty:
+                        send({'t': 'ping'})
+                        continue
+                    if channel == 'state':
+                        state = state_view()
+                        delta = _diff(last_state, state)
+                        last_state = state
+                        if delta:
+                            send({'t': 'state', 'v': payload, 'd': delta})
+                    elif channel == 'close':
+                        break
+                    else:
+                        send({'t': channel, 'd': payload})
+            except Exception:
+                # socket gone; the receive loop notices and cleans up
+                closed.set()
+
+        sender_thread = threading.Thread(target=sender, name=f'ws-send-{room_name}', daemon=True)
+        sender_thread.start()
+
+        try:
+            while not closed.is_set():
+                raw = ws.receive(timeout=30)
+                if raw is None:
+                    continue
+                try:
+                    frame = json.loads(raw)
+                except ValueError:
+                    frame = None
+                if not isinstance(frame, dict):
+                    send_raw({'t': 'ack', 'id': None, 'ok': False, 'status': 400,
+                              'd': {'error': 'Malformed frame'}})
+                    continue
+
+                action = _frame_request(frame.get('t'), frame.get('d') or {})
+                if len(action) == 3:
+                    status, body = run_request(*action)
+                else:
+                    status, body = action
+
+                if frame.get('id') is not None:
+                    send_raw({'t': 'ack', 'id': frame['id'], 'ok': 200 <= status < 300,
+                              'status': status, 'd': body})
+        except Exception:
+            # ConnectionClosed and friends: the client went away
+            pass
+        finally:
+            closed.set()
+            conn.push(('close', None))
+            hub.unsubscribe(conn)
+            tally.unsubscribe(vote_feed)
+
+    return True
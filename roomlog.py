@@ -0,0 +1,441 @@
+"""Event-sourced game state for a room.
+
+Every change to a room's players, roles, assignments and game flags is
+recorded as a typed Event in an append-only RoomLog and applied to the room
+dict by that event type's reducer, so the rest of the app keeps reading the
+room dict as before. The log is what undo/redo, the host's game history,
+change notifications and the on-disk journal are built from.
+
+Undo removes the most recent host action from the active event list and
+rebuilds the state from the nearest snapshot taken before it, replaying only
+the events after that snapshot (snapshots are taken every SNAPSHOT_EVERY
+events). Redo puts the action back at its original place and rebuilds the
+same way. Player actions (join/leave) are never undone, but they stay in
+place when an earlier host action is undone or redone. Undo and redo are
+themselves appended to the log, so the log is never rewritten.
+
+When a journal path is given, the room header and every event are appended
+to it as JSON lines; RoomLog.restore() rebuilds a room from that file. The
+writes are queued for one background writer thread (in order, so a journal
+is deleted only after its last append), never done under the rooms lock,
+and the file is readable by its owner only since the header holds the host
+password and token.
+"""
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+
+import catalog
+
+# Active events between snapshots
+SNAPSHOT_EVERY = 32
+
+# Host actions: the only events undo/redo act on
+HOST_ACTIONS = frozenset({
+    'add_role', 'remove_role', 'reset_roles', 'assign', 'restart', 'reset',
+    'kill', 'kick', 'set_password', 'set_role_pack',
+})
+PLAYER_ACTIONS = frozenset({'join', 'leave'})
+MARKERS = frozenset({'undo', 'redo'})
+
+EMPTY_STATE = {
+    'players': [],
+    'roles': [],
+    'assignments': {},
+    'assignment_factions': {},
+    'game_started': False,
+    'eliminated_players': [],
+    'player_password': None,
+    'role_pack': None,
+}
+
+
+class UndoError(Exception):
+    """Raised when there is nothing to undo or redo."""
+
+
+class Event:
+    __slots__ = ('seq', 'kind', 'data', 'ts')
+
+    def __init__(self, seq, kind, data, ts=None):
+        self.seq = seq
+        self.kind = kind
+        self.data = data
+        self.ts = int(time.time()) if ts is None else ts
+
+    def to_json(self):
+        return {'seq': self.seq, 'kind': self.kind, 'data': self.data, 'ts': self.ts}
+
+
+def copy_state(room):
+    """Copy of the event-sourced part of a room (the role pack is immutable and shared)."""
+    return {
+        'players': [dict(p) for p in room.get('players', [])],
+        'roles': [dict(r) for r in room.get('roles', [])],
+        'assignments': dict(room.get('assignments', {})),
+        'assignment_factions': dict(room.get('assignment_factions', {})),
+        'game_started': room.get('game_started', False),
+        'eliminated_players': list(room.get('eliminated_players', [])),
+        'player_password': room.get('player_password'),
+        'role_pack': room.get('role_pack'),
+    }
+
+
+# ----------------- Reducers -----------------
+# Each reducer applies one event to the room dict in place. They are replayed
+# after an undo against a state that may differ from the original one, so they
+# tolerate missing players/roles instead of failing.
+def _drop_player(room, name):
+    room['assignments'].pop(name, None)
+    if name in room['eliminated_players']:
+        room['eliminated_players'].remove(name)
+
+
+def _join(room, d):
+    for p in room['players']:
+        if p['name'] == d['name']:
+            # only on replay: e.g. a kicked player rejoined on a new device and the kick was
+            # undone; the player is on the device they joined from last
+            p['device_id'] = d.get('device_id')
+            return
+    room['players'].append({'name': d['name'], 'device_id': d.get('device_id')})
+
+
+def _leave(room, d):
+    room['players'][:] = [p for p in room['players']
+                          if not (p['name'] == d['name'] and p.get('device_id') == d.get('device_id'))]
+    _drop_player(room, d['name'])
+
+
+def _kick(room, d):
+    room['players'][:] = [p for p in room['players'] if p['name'] != d['name']]
+    _drop_player(room, d['name'])
+
+
+def _kill(room, d):
+    if d['name'] not in room['eliminated_players'] and any(p['name'] == d['name'] for p in room['players']):
+        room['eliminated_players'].append(d['name'])
+
+
+def _add_role(room, d):
+    room['roles'].append({'name': d['name'], 'count': d['count'], 'faction': d.get('faction', '')})
+
+
+def _remove_role(room, d):
+    if 0 <= d['index'] < len(room['roles']):
+        room['roles'].pop(d['index'])
+
+
+def _reset_roles(room, d):
+    room['roles'].clear()
+    room['assignments'].clear()
+    room['game_started'] = False
+
+
+def _assign(room, d):
+    room['assignments'].clear()
+    room['assignments'].update(d['assignments'])
+    room['assignment_factions'] = dict(d['factions'])
+    room['game_started'] = True
+
+
+def _restart(room, d):
+    room['assignments'].clear()
+    room['eliminated_players'] = []
+    room['assignment_factions'] = {}
+    room['game_started'] = False
+
+
+def _reset(room, d):
+    room['players'].clear()
+    room['roles'].clear()
+    room['assignments'].clear()
+    room['assignment_factions'] = {}
+    room['game_started'] = False
+    room['player_password'] = None
+    room['eliminated_players'] = []
+
+
+def _set_password(room, d):
+    room['player_password'] = d['password'] or None
+
+
+def _set_role_pack(room, d):
+    room['role_pack'] = catalog.parse_pack(d['pack']) if d['pack'] else None
+
+
+REDUCERS = {
+    'join': _join,
+    'leave': _leave,
+    'kick': _kick,
+    'kill': _kill,
+    'add_role': _add_role,
+    'remove_role': _remove_role,
+    'reset_roles': _reset_roles,
+    'assign': _assign,
+    'restart': _restart,
+    'reset': _reset,
+    'set_password': _set_password,
+    'set_role_pack': _set_role_pack,
+}
+
+
+def describe(event, target=None):
+    """One-line, human-readable description of an event for the history view."""
+    d = event.data
+    kind = event.kind
+    if kind in MARKERS:
+        what = describe(target) if target is not None else f"event #{d['target']}"
+        return ('Undid: ' if kind == 'undo' else 'Redid: ') + what
+    if kind == 'join':
+        return f"{d['name']} moved here from table {d['source']}" if d.get('source') else f"{d['name']} joined"
+    if kind == 'leave':
+        return f"{d['name']} moved to table {d['to']}" if d.get('to') else f"{d['name']} left"
+    if kind == 'kick':
+        return f"Host kicked {d['name']}"
+    if kind == 'kill':
+        return f"{d['name']} was voted out" if d.get('via') == 'vote' else f"Host eliminated {d['name']}"
+    if kind == 'add_role':
+        return f"Host added role {d['name']} x{d['count']}"
+    if kind == 'remove_role':
+        return f"Host removed role {d.get('name') or '#' + str(d['index'] + 1)}"
+    if kind == 'reset_roles':
+        return 'Host cleared the roles'
+    if kind == 'assign':
+        return f"Host assigned roles to {len(d['assignments'])} players"
+    if kind == 'restart':
+        return 'Host restarted the game'
+    if kind == 'reset':
+        return 'Host reset the room'
+    if kind == 'set_password':
+        return 'Host set the player password' if d['password'] else 'Host removed the player password'
+    if kind == 'set_role_pack':
+        return f"Host set a custom role pack ({len(d['pack'])} roles)" if d['pack'] else 'Host removed the custom role pack'
+    return kind
+
+
+class _Writer:
+    """One daemon thread running journal disk jobs in order. Started by the first submit()."""
+
+    def __init__(self):
+        self._jobs = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def submit(self, func, *args):
+        self._jobs.put((func, args))
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='room-journal-writer',
+                                                    daemon=True)
+                    self._thread.start()
+
+    def flush(self):
+        """Wait until every job submitted so far has run."""
+        if self._thread is not None:
+            self._jobs.join()
+
+    def _run(self):
+        while True:
+            func, args = self._jobs.get()
+            try:
+                func(*args)
+            except Exception as e:
+                print(f"[ROOMLOG] journal job failed: {e}")
+            finally:
+                self._jobs.task_done()
+
+
+writer = _Writer()
+# events recorded just before shutdown still reach the journal
+atexit.register(writer.flush)
+
+
+def _write_journal(path, line, create=False):
+    """Writer thread: append line to the journal, or (create=True) start it with line as header."""
+    flags = os.O_WRONLY | os.O_CREAT | (os.O_TRUNC if create else os.O_APPEND)
+    try:
+        fd = os.open(path, flags, 0o600)
+        if create:
+            os.fchmod(fd, 0o600)  # a journal left by an earlier room of the same name
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(line)
+    except OSError as e:
+        print(f"Warning: could not write room journal {path}: {e}")
+
+
+def _remove_journal(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class RoomLog:
+    """Append-only event log and snapshots for one room. Callers hold the rooms lock."""
+
+    __slots__ = ('events', 'active', 'redo_stack', 'snapshots', 'journal')
+
+    def __init__(self, journal=None, header=None):
+        self.events = []       # every event including undo/redo markers, in order
+        self.active = []       # events currently applied to the room, in seq order
+        self.redo_stack = []   # undone host actions, most recent last
+        # (number of active events applied, state copy); always starts with the empty state
+        self.snapshots = [(0, copy_state(EMPTY_STATE))]
+        self.journal = journal
+        if journal and header is not None:
+            writer.submit(_write_journal, journal, json.dumps(header) + '\n', True)
+
+    def __len__(self):
+        return len(self.events)
+
+    @property
+    def version(self):
+        return self.events[-1].seq if self.events else 0
+
+    # ----- writes -----
+    def _append(self, kind, data, ts=None):
+        event = Event(len(self.events) + 1, kind, data, ts)
+        self.events.append(event)
+        if self.journal:
+            writer.submit(_write_journal, self.journal, json.dumps(event.to_json()) + '\n')
+        return event
+
+    def _apply(self, room, event):
+        REDUCERS[event.kind](room, event.data)
+        self.active.append(event)
+        if len(self.active) % SNAPSHOT_EVERY == 0:
+            self.snapshots.append((len(self.active), copy_state(room)))
+
+    def record(self, room, kind, data=None):
+        """Append an event of the given kind and apply it to room. Returns the Event."""
+        if kind not in REDUCERS:
+            raise ValueError(f'Unknown event kind {kind}')
+        event = self._append(kind, data or {})
+        if kind in HOST_ACTIONS:
+            # a new host action starts a new branch
+            self.redo_stack.clear()
+        self._apply(room, event)
+        return event
+
+    def _rebuild(self, room, index):
+        """Re-derive room state after active[index:] changed: restore the last snapshot at or
+        before index and replay the active events after it."""
+        while self.snapshots[-1][0] > index:
+            self.snapshots.pop()
+        count, state = self.snapshots[-1]
+        room.update(copy_state(state))
+        replay = self.active[count:]
+        del self.active[count:]
+        for event in replay:
+            self._apply(room, event)
+
+    def undo(self, room):
+        """Undo the most recent host action still in effect. Returns the undo marker event."""
+        for i in range(len(self.active) - 1, -1, -1):
+            if self.active[i].kind in HOST_ACTIONS:
+                break
+        else:
+            raise UndoError('Nothing to undo')
+        target = self.active.pop(i)
+        self.redo_stack.append(target)
+        self._rebuild(room, i)
+        return self._append('undo', {'target': target.seq})
+
+    def _reinsert(self, event):
+        """Put an undone event back at its original place in active. Returns its index."""
+        i = len(self.active)
+        while i and self.active[i - 1].seq > event.seq:
+            i -= 1
+        self.active.insert(i, event)
+        return i
+
+    def redo(self, room):
+        """Re-apply the most recently undone host action at its original place (before any
+        player actions recorded since the undo). Returns the redo marker event."""
+        if not self.redo_stack:
+            raise UndoError('Nothing to redo')
+        target = self.redo_stack.pop()
+        self._rebuild(room, self._reinsert(target))
+        return self._append('redo', {'target': target.seq})
+
+    # ----- reads -----
+    def can_undo(self):
+        return any(e.kind in HOST_ACTIONS for e in self.active)
+
+    def can_redo(self):
+        return bool(self.redo_stack)
+
+    def history(self, limit=None):
+        """Events newest first as {seq, kind, ts, text, undone} for the history view."""
+        in_effect = {e.seq for e in self.active}
+        events = self.events if limit is None else self.events[-limit:]
+        out = []
+        for event in reversed(events):
+            target = self.events[event.data['target'] - 1] if event.kind in MARKERS else None
+            out.append({
+                'seq': event.seq,
+                'kind': event.kind,
+                'ts': event.ts,
+                'text': describe(event, target),
+                'undone': event.kind not in MARKERS and event.seq not in in_effect,
+            })
+        return out
+
+    # ----- persistence -----
+    def discard(self):
+        """Have the writer delete the journal (the room expired or was removed)."""
+        if self.journal:
+            writer.submit(_remove_journal, self.journal)
+            self.journal = None
+
+    @classmethod
+    def restore(cls, room, path):
+        """Rebuild room's state from a journal written by a RoomLog. Returns the log,
+        which keeps appending to the same file."""
+        _, records = read_journal(path)
+        log = cls()
+        for rec in records:
+            event = Event(rec['seq'], rec['kind'], rec['data'], rec['ts'])
+            log.events.append(event)
+            if event.kind == 'undo':
+                target = log.events[event.data['target'] - 1]
+                log.active.remove(target)
+                log.redo_stack.append(target)
+            elif event.kind == 'redo':
+                target = log.events[event.data['target'] - 1]
+                log.redo_stack.remove(target)
+                log._reinsert(target)
+            else:
+                if event.kind in HOST_ACTIONS:
+                    log.redo_stack.clear()
+                log.active.append(event)
+        log._rebuild(room, 0)
+        try:
+            os.chmod(path, 0o600)  # written before journals were private
+        except OSError as e:
+            print(f"Warning: could not restrict room journal {path}: {e}")
+        log.journal = path
+        return log
+
+
+def read_journal(path):
+    """Return (header, [event records]) from a journal file."""
+    with open(path, 'r', encoding='utf-8') as f:
+        lines = [line for line in f if line.strip()]
+    if not lines:
+        raise ValueError(f'Empty room journal {path}')
+    records = []
+    for n, line in enumerate(lines[1:], start=2):
+        try:
+            records.append(json.loads(line))
+        except json.JSONDecodeError:
+            if n != len(lines):
+                raise
+            # a write cut short by a crash: the event never took effect
+            print(f"Warning: ignoring truncated last line of {path}")
+    return json.loads(lines[0]), records
@@ -0,0 +1,168 @@
+// Client for the multiplexed room WebSocket (/api/rooms/<room>/ws, see realtime.py).
+//
+//   const live = MafiaLive.connect(ROOM_NAME, {
+//     after: boot.cursor.chat_id,  // optional: only chat newer than this (from /bootstrap)
+//     onOpen() {},              // socket is up: stop polling / close SSE streams
+//     onClose() {},             // socket is down: resume polling / SSE until it reconnects
+//     onHello(frame) {},        // initial (or resync) state, chat backlog and vote snapshot
+//     onState(delta, version) {},
+//     onChat(message) {},
+//     onVote(event) {},
+//     onPhase(clock) {},        // round clock changed (see phases.py); feed it to a phaseCountdown
+//   });
+//   live.send('chat', { message: 'hi' }).then(ack => ...);   // ack = {ok, status, d}
+//
+// If the server has no WebSocket support the socket never opens and onOpen is never
+// called, so pages simply keep their HTTP fallback.
+//
+//   MafiaLive.bootstrap(ROOM_NAME).then(boot => ...);  // /bootstrap payload, or null
+//
+//   const showPhase = MafiaLive.phaseCountdown(el);  // showPhase(state.phase) on every update
+(function () {
+  const RECONNECT_MIN_MS = 1000;
+  const RECONNECT_MAX_MS = 30000;
+  const ACK_TIMEOUT_MS = 10000;
+
+  function connect(roomName, handlers) {
+    const h = handlers || {};
+    const url = (location.protocol === 'https:' ? 'wss://' : 'ws://') + location.host +
+      `/api/rooms/${encodeURIComponent(roomName)}/ws`;
+    // last chat id seen, so a reconnect does not replay the backlog
+    let chatCursor = (h.after === undefined || h.after === null) ? null : h.after;
+    const pending = new Map();
+    let ws = null;
+    let nextId = 1;
+    let lastSeq = 0;
+    let everOpened = false;
+    let delay = RECONNECT_MIN_MS;
+    let stopped = false;
+
+    function call(name, ...args) {
+      try { if (h[name]) h[name](...args); } catch (e) { console.warn(`live ${name} handler failed`, e); }
+    }
+
+    function failPending(reason) {
+      pending.forEach(p => { clearTimeout(p.timer); p.reject(new Error(reason)); });
+      pending.clear();
+    }
+
+    function open() {
+      if (stopped || !('WebSocket' in window)) return;
+      try { ws = new WebSocket(chatCursor === null ? url : `${url}?after=${chatCursor}`); } catch (e) { return; }
+
+      ws.onopen = () => {
+        everOpened = true;
+        delay = RECONNECT_MIN_MS;
+        lastSeq = 0;
+        call('onOpen');
+      };
+
+      ws.onmessage = (e) => {
+        let frame;
+        try { frame = JSON.parse(e.data); } catch (err) { return; }
+        if (frame.t === 'ack') {
+          const p = pending.get(frame.id);
+          if (p) {
+            pending.delete(frame.id);
+            clearTimeout(p.timer);
+            p.resolve({ ok: frame.ok, status: frame.status, d: frame.d || {} });
+          }
+          return;
+        }
+        if (frame.seq && lastSeq && frame.seq !== lastSeq + 1) {
+          console.warn('live: missed events, waiting for snapshot');
+        }
+        lastSeq = frame.seq || lastSeq;
+        if (frame.t === 'hello' || frame.t === 'snapshot') {
+          const chat = frame.chat || [];
+          if (chat.length) chatCursor = chat[chat.length - 1].id;
+          call('onHello', frame);
+        } else if (frame.t === 'state') {
+          call('onState', frame.d || {}, frame.v);
+        } else if (frame.t === 'chat') {
+          if (frame.d && frame.d.id) chatCursor = frame.d.id;
+          call('onChat', frame.d);
+        } else if (frame.t === 'vote') {
+          call('onVote', frame.d);
+        } else if (frame.t === 'phase') {
+          call('onPhase', frame.d);
+        }
+      };
+
+      ws.onclose = () => {
+        ws = null;
+        failPending('socket closed');
+        if (everOpened) call('onClose');
+        // a server without the endpoint refuses the upgrade every time: back off to the max
+        if (!stopped) {
+          setTimeout(open, delay);
+          delay = Math.min(delay * 2, RECONNECT_MAX_MS);
+        }
+      };
+    }
+
+    function send(type, data) {
+      return new Promise((resolve, reject) => {
+        if (!ws || ws.readyState !== WebSocket.OPEN) {
+          reject(new Error('socket not open'));
+          return;
+        }
+        const id = nextId++;
+        const timer = setTimeout(() => {
+          pending.delete(id);
+          reject(new Error('ack timeout'));
+        }, ACK_TIMEOUT_MS);
+        pending.set(id, { resolve, reject, timer });
+        ws.send(JSON.stringify({ t: type, id, d: data || {} }));
+      });
+    }
+
+    open();
+    return {
+      send,
+      command: (name, args) => send('cmd', { name, args: args || {} }),
+      get connected() { return !!ws && ws.readyState === WebSocket.OPEN; },
+      close() { stopped = true; if (ws) ws.close(); },
+    };
+  }
+
+  // One-shot page state (see /api/rooms/<room>/bootstrap). Resolves to null on failure.
+  function bootstrap(roomName) {
+    return fetch(`/api/rooms/${encodeURIComponent(roomName)}/bootstrap`, { credentials: 'same-origin' })
+      .then(r => (r.ok ? r.json() : null))
+      .catch(() => null);
+  }
+
+  // Countdown for the room's round clock in el (hidden in the lobby). Returns update(clock), to be
+  // called with each clock snapshot (/players 'phase', phase frames). Deadlines are absolute server
+  // times, so a reconnecting page just resumes; snapshots carrying server_time correct for skew.
+  const PHASE_LABELS = { night: 'Night', day: 'Day', vote: 'Vote' };
+
+  function phaseCountdown(el) {
+    let clock = null;
+    let skew = 0;
+    let ticker = null;
+
+    function render() {
+      if (!clock || clock.phase === 'lobby') { el.style.display = 'none'; return; }
+      const left = clock.paused ? clock.remaining : Math.max(0, clock.deadline - (Date.now() / 1000 + skew));
+      const secs = Math.ceil(left);
+      el.textContent = `${PHASE_LABELS[clock.phase] || clock.phase} ${clock.round} · ` +
+        `${Math.floor(secs / 60)}:${String(secs % 60).padStart(2, '0')}` + (clock.paused ? ' (paused)' : '');
+      el.style.display = '';
+    }
+
+    return function update(next) {
+      if (next && next.server_time) skew = next.server_time - Date.now() / 1000;
+      // a poll that raced a pushed frame can be older than what we show
+      if (next && clock && next.version < clock.version) return;
+      clock = next || null;
+      clearInterval(ticker);
+      ticker = null;
+      render();
+      if (clock && clock.phase !== 'lobby' && !clock.paused) ticker = setInterval(render, 1000);
+    };
+  }
+
+  window.MafiaLive = { connect, bootstrap, phaseCountdown };
+})();
@@ -0,0 +1,214 @@
+"""Day-vote tallies for a room.
+
+A VoteTally keeps a voter -> target map and a per-candidate counter so each
+cast, change or retraction is O(1). Every change is published as a small
+delta to subscriber queues (used by the SSE vote stream). Each tally has its
+own lock, so counting a lobby's votes only contends on that room's tally; the
+vote endpoint holds the global rooms lock just long enough to find the room
+and check the voter.
+"""
+import queue
+import time
+from collections import Counter
+from threading import Lock
+
+# Per-subscriber buffered deltas before the subscriber is told to resync
+SUBSCRIBER_QUEUE_SIZE = 256
+
+
+class VoteError(Exception):
+    """Raised when a vote cannot be cast (voting closed, bad voter or target)."""
+
+
+class Subscriber:
+    """A bounded queue of vote events for one stream client."""
+
+    def __init__(self):
+        self.queue = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        # set when events were dropped; the stream should send a fresh snapshot
+        self.overflowed = False
+
+    def push(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            self.overflowed = True
+
+
+class VoteTally:
+    def __init__(self):
+        self._lock = Lock()
+        self._subscribers = []
+        self.version = 0
+        self.open = False
+        self.round = 0
+        self.opened_at = None
+        self.candidates = []
+        self.voters = frozenset()
+        self.votes = {}  # voter -> target
+        self.counts = Counter()  # target -> number of votes
+
+    # ----- lifecycle -----
+    def start(self, voters, candidates):
+        """Open a new voting round, discarding any previous votes."""
+        with self._lock:
+            self.open = True
+            self.round += 1
+            self.opened_at = int(time.time())
+            self.voters = frozenset(voters)
+            self.candidates = list(candidates)
+            self.votes = {}
+            self.counts = Counter()
+            self.version += 1
+            self._publish_locked(dict(self._snapshot_locked(), type='open'))
+
+    def close(self):
+        """Close voting. Returns the final snapshot including the winner (None on a tie or no votes)."""
+        with self._lock:
+            if not self.open:
+                raise VoteError('Voting is not open')
+            self.open = False
+            self.version += 1
+            snap = self._snapshot_locked()
+            self._publish_locked(dict(snap, type='closed'))
+        return snap
+
+    def cancel(self):
+        """Drop the current round (e.g. on game restart) without a result."""
+        with self._lock:
+            if not self.open and not self.votes:
+                return
+            self.open = False
+            self.votes = {}
+            self.counts = Counter()
+            self.version += 1
+            self._publish_locked(dict(self._snapshot_locked(), type='closed'))
+
+    # ----- votes -----
+    def cast(self, voter, target):
+        """Cast, change or (target=None) retract voter's vote. Returns the published delta."""
+        with self._lock:
+            if not self.open:
+                raise VoteError('Voting is not open')
+            if voter not in self.voters:
+                raise VoteError('You are not allowed to vote')
+            if target is not None and target not in self.candidates:
+                raise VoteError('Invalid vote target')
+
+            prev = self.votes.get(voter)
+            if prev == target:
+                return None
+            changed = {}
+            if prev is not None:
+                self.counts[prev] -= 1
+                if not self.counts[prev]:
+                    del self.counts[prev]
+                changed[prev] = self.counts.get(prev, 0)
+            if target is None:
+                self.votes.pop(voter, None)
+            else:
+                self.votes[voter] = target
+                self.counts[target] += 1
+                changed[target] = self.counts[target]
+
+            self.version += 1
+            delta = {
+                'type': 'vote',
+                'version': self.version,
+                'round': self.round,
+                'voter': voter,
+                'target': target,
+                'counts': changed,
+            }
+            self._publish_locked(delta)
+        return delta
+
+    def remove_voter(self, name):
+        """Forget a player who left, was kicked or eliminated mid-vote: drop their vote and candidacy."""
+        with self._lock:
+            if not self.open or (name not in self.voters and name not in self.candidates):
+                return
+            self.voters = self.voters - {name}
+            prev = self.votes.pop(name, None)
+            if prev is not None:
+                self.counts[prev] -= 1
+                if not self.counts[prev]:
+                    del self.counts[prev]
+            if name in self.candidates:
+                self.candidates = [c for c in self.candidates if c != name]
+                for voter in [v for v, t in self.votes.items() if t == name]:
+                    del self.votes[voter]
+                self.counts.pop(name, None)
+            self.version += 1
+            self._publish_locked(dict(self._snapshot_locked(), type='snapshot'))
+
+    def set_players(self, voters, candidates):
+        """Replace who may vote and be voted for in the open round (undo/redo changed who is alive),
+        keeping the votes that are still valid."""
+        with self._lock:
+            if not self.open:
+                return
+            voters = frozenset(voters)
+            candidates = list(candidates)
+            if voters == self.voters and candidates == self.candidates:
+                return
+            self.voters = voters
+            self.candidates = candidates
+            self.votes = {v: t for v, t in self.votes.items() if v in voters and t in candidates}
+            self.counts = Counter(self.votes.values())
+            self.version += 1
+            self._publish_locked(dict(self._snapshot_locked(), type='snapshot'))
+
+    # ----- reads -----
+    def snapshot(self):
+        with self._lock:
+            return self._snapshot_locked()
+
+    def _snapshot_locked(self):
+        leaders = []
+        if self.counts:
+            top = max(self.counts.values())
+            leaders = sorted(c for c, n in self.counts.items() if n == top)
+        return {
+            'version': self.version,
+            'round': self.round,
+            'open': self.open,
+            'opened_at': self.opened_at,
+            'candidates': list(self.candidates),
+            'votes': dict(self.votes),
+            'counts': dict(self.counts),
+            'leaders': leaders,
+            'winner': leaders[0] if len(leaders) == 1 else None,
+        }
+
+    # ----- subscriptions -----
+    def subscribe(self, sub=None):
+        """Register a subscriber (a new Subscriber unless one with a push() method is given).
+        Returns (subscriber, snapshot) taken atomically."""
+        if sub is None:
+            sub = Subscriber()
+        with self._lock:
+            self._subscribers.append(sub)
+            return sub, self._snapshot_locked()
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            try:
+                self._subscribers.remove(sub)
+            except ValueError:
+                pass
+
+    def resync(self, sub):
+        """Clear an overflowed subscriber's queue and return a fresh snapshot."""
+        with self._lock:
+            while True:
+                try:
+                    sub.queue.get_nowait()
+                except queue.Empty:
+                    break
+            sub.overflowed = False
+            return self._snapshot_locked()
+
+    def _publish_locked(self, event):
+        for sub in self._subscribers:
+            sub.push(event)